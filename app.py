@@ -2,26 +2,287 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import io
+import hashlib
+import json
 from PIL import Image
 import time
 import utils
+import os
+import threading
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import model
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
+import report
+import tracing
+import verifier
+from inference_daemon import InferenceError, get_client as get_inference_client
+from ingest import ingest_upload
+from jobs import Job, JobQueue, QueueFullError, current_job
+from model_registry import registry
+from quality import assess_image_quality
+from result_cache import MemoryTier, create_result_cache_from_env, make_cache_key
+from session_store import SessionArtifactStore
+
+# Verifier batching limits, shared by every session on this server
+VERIFIER_MAX_BATCH_SIZE = int(os.environ.get("KHAIRE_VERIFIER_MAX_BATCH", "8"))
+VERIFIER_MAX_WAIT_MS = float(os.environ.get("KHAIRE_VERIFIER_MAX_WAIT_MS", "5"))
+
+# Analyses run on a shared worker pool instead of the session's script thread.
+# Its size is the admission limit: at most this many analyses compete for the
+# CPU, up to ANALYSIS_MAX_PENDING more wait their turn, and the rest are turned
+# away at once rather than slowing everyone down
+ANALYSIS_WORKERS = int(os.environ.get("KHAIRE_ANALYSIS_WORKERS", "4"))
+ANALYSIS_MAX_PENDING = int(os.environ.get("KHAIRE_ANALYSIS_MAX_PENDING", "32"))
+# Reports have their own small pool so they never hold an analysis slot
+REPORT_WORKERS = int(os.environ.get("KHAIRE_REPORT_WORKERS", "2"))
+REPORT_MAX_PENDING = int(os.environ.get("KHAIRE_REPORT_MAX_PENDING", "16"))
+JOB_POLL_INTERVAL = 0.5
+
+# Images kept for each session are compressed, capped and dropped when idle
+SESSION_BUDGET_MB = float(os.environ.get("KHAIRE_SESSION_BUDGET_MB", "8"))
+SESSION_TTL_SECONDS = float(os.environ.get("KHAIRE_SESSION_TTL", "1800"))
+
+# Verifier decisions are shared by every session, keyed by image and model version
+VERIFICATION_CACHE_ENTRIES = int(os.environ.get("KHAIRE_VERIFICATION_CACHE_ENTRIES", "1024"))
+
+# Generated reports are kept per analysis so repeat downloads are instant
+REPORT_CACHE_ENTRIES = int(os.environ.get("KHAIRE_REPORT_CACHE_ENTRIES", "32"))
+
+# Show the per-stage timing panel under the results
+SHOW_TIMINGS = os.environ.get("KHAIRE_SHOW_TIMINGS", "1") == "1"
+
+# Load and warm up the models in the background when the server starts
+PRELOAD_MODELS = os.environ.get("KHAIRE_PRELOAD_MODELS", "1") == "1"
+
+@st.cache_resource
+def start_model_warmup():
+    # Runs once per server process; page rendering does not wait for it
+    thread = threading.Thread(target=registry.warmup, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def load_verifier_scheduler():
+    # With an inference daemon, the daemon owns the model and batches across processes
+    client = get_inference_client()
+    if client is not None:
+        return client.verifier()
+    
+    # One scheduler per server process so requests from all sessions share batches.
+    # It resolves the verifier through the registry, so hot swaps apply to it.
+    return verifier.create_verifier_scheduler(
+        max_batch_size=VERIFIER_MAX_BATCH_SIZE,
+        max_wait_ms=VERIFIER_MAX_WAIT_MS,
+    )
+
+@st.cache_resource
+def load_result_cache():
+    # Shared across sessions so any user's repeat upload of an image is a hit
+    return create_result_cache_from_env()
+
+@st.cache_resource
+def load_job_queue():
+    return JobQueue(max_workers=ANALYSIS_WORKERS, max_pending=ANALYSIS_MAX_PENDING)
+
+@st.cache_resource
+def load_report_queue():
+    return JobQueue(max_workers=REPORT_WORKERS, max_pending=REPORT_MAX_PENDING, thread_name_prefix="report-job")
+
+@st.cache_resource
+def load_session_store():
+    return SessionArtifactStore(
+        session_budget_bytes=int(SESSION_BUDGET_MB * 1024 * 1024),
+        ttl_seconds=SESSION_TTL_SECONDS,
+    )
+
+@st.cache_resource
+def load_verification_cache():
+    return MemoryTier(max_entries=VERIFICATION_CACHE_ENTRIES, ttl_seconds=None)
 
 @st.cache_resource
-def load_fundus_model():
-    model = load_model("fundus_verifier.h5")  # or "models/fundus_verifier.h5"
-    return model
+def load_report_cache():
+    return MemoryTier(max_entries=REPORT_CACHE_ENTRIES)
+
+result_cache = load_result_cache()
+report_cache = load_report_cache()
+verification_cache = load_verification_cache()
+job_queue = load_job_queue()
+report_queue = load_report_queue()
+session_store = load_session_store()
+# The inference daemon warms its own models; this process never loads them
+if PRELOAD_MODELS and get_inference_client() is None:
+    start_model_warmup()
+
+def verify_fundus(upload):
+    # Reruns, and other sessions uploading the same image, reuse the decision
+    key = verifier.verification_key(upload.content_hash)
+    is_fundus = verification_cache.get(key)
+    if is_fundus is not None:
+        return is_fundus
+    
+    # The verifier (and TensorFlow) is loaded on the first upload, not at page load
+    with tracing.span("verify"):
+        try:
+            is_fundus = verifier.verify_fundus_input(upload.verifier_input, load_verifier_scheduler())
+        except (FutureTimeoutError, InferenceError) as e:
+            print(f"Fundus verification failed: {e!r}")
+            st.error("❌ The image could not be verified right now. Please try again in a moment.")
+            st.stop()
+    verification_cache.put(key, is_fundus)
+    return is_fundus
+
+def run_analysis(analysis_image, cache_key, trace, image_quality=None):
+    # Runs on a job worker thread, so it must not touch st.session_state
+    with trace.activate():
+        try:
+            with tracing.span("preprocess", image_size=list(analysis_image.size)):
+                processed_img = utils.preprocess_image(analysis_image)
+            if current_job().cancelled:
+                return None
+            
+            with tracing.span("predict"):
+                results = model.predict_health_conditions(processed_img, image_quality=image_quality)
+        finally:
+            # Failed analyses are logged too, with the error on the failing span
+            trace.finish()
+    
+    analysis = {"processed_image": processed_img, "results": results}
+    # Partial results are shown but not cached, so a retry runs the failed models
+    if "model_errors" not in results:
+        result_cache.put(cache_key, analysis)
+    return analysis
 
-fundus_model = load_fundus_model()
+def make_report_key(analysis_key, results, report_format):
+    # The analysis key pins the image the report embeds. The results digest is
+    # needed too: analyses with model errors are not cached, so two runs on
+    # the same image and models can produce different results
+    digest = hashlib.sha256(json.dumps(results, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"{analysis_key}:{digest}:{report_format}"
 
-def verify_fundus(img):
-    img = img.resize((224, 224)).convert('RGB')
-    img_array = image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0) / 255.0
-    pred = fundus_model.predict(img_array)[0][0]
-    return bool(pred >= 0.5)
+def generate_report(results, images, report_format, report_key):
+    # Runs on a job worker thread
+    data = report.build_report(results, images, report_format)
+    report_cache.put(report_key, data)
+    return data
+
+def show_analysis(analysis):
+    # Images go to the session store as JPEG; session state keeps only the scores
+    session_id = st.session_state.session_id
+    session_store.put_image(session_id, "processed_image", analysis["processed_image"])
+    
+    results = dict(analysis["results"])
+    glaucoma = dict(results.get("glaucoma", {}))
+    overlay = glaucoma.pop("processed_image", None)
+    session_store.discard(session_id, "roi_overlay")
+    if overlay is not None:
+        session_store.put_image(session_id, "roi_overlay", overlay)
+    results["glaucoma"] = glaucoma
+    
+    st.session_state.analysis_results = results
+    st.session_state.show_results = True
+
+def cancel_analysis_job():
+    job = st.session_state.get("analysis_job")
+    if job is not None:
+        job.cancel()
+        st.session_state.analysis_job = None
+
+def get_ingested_upload(uploaded_file):
+    # Decode each upload once; later reruns reuse the variants kept in the session
+    ingested = st.session_state.get("ingested_upload")
+    if ingested is None or ingested[0] != uploaded_file.file_id:
+        # A new image makes any analysis still running for the old one moot
+        cancel_analysis_job()
+        data = uploaded_file.getvalue()
+        
+        # The upload trace stays open until the image has been verified
+        trace = tracing.Trace("upload", file_name=uploaded_file.name, file_bytes=len(data))
+        with trace.activate(), tracing.span("decode"):
+            upload = ingest_upload(data)
+            tracing.set_attributes(original_size=list(upload.original_size))
+        
+        # Cheap enough to run on every upload, and it runs before any model work
+        with trace.activate(), tracing.span("quality"):
+            image_quality = assess_image_quality(upload.verifier_thumbnail)
+            tracing.set_attributes(score=image_quality["quality_score"], suitable=image_quality["is_suitable"])
+        st.session_state.upload_quality = image_quality
+        
+        # Keep the image variants compressed in the session store; the analysis
+        # image is PNG so the pixels the models see are unchanged
+        session_id = st.session_state.session_id
+        session_store.put_image(session_id, "preview", upload.preview)
+        session_store.put_image(session_id, "analysis_image", upload.analysis_image, format="PNG")
+        
+        ingested = (uploaded_file.file_id, upload.compact())
+        st.session_state.ingested_upload = ingested
+        st.session_state.upload_trace = trace
+    return ingested[1]
+
+def show_session_memory():
+    session_bytes = session_store.session_usage(st.session_state.session_id)
+    usage = session_store.usage()
+    st.sidebar.caption(
+        f"Session memory: {session_bytes / 1024:.0f} KB of {SESSION_BUDGET_MB:.0f} MB · "
+        f"{usage['sessions']} active sessions using {usage['total_bytes'] / 1024 / 1024:.1f} MB"
+    )
+
+def show_report_export():
+    report_format = st.radio("Report format", ["PDF", "HTML"], horizontal=True)
+    mime, extension = report.REPORT_FORMATS[report_format.lower()]
+    report_key = make_report_key(st.session_state.analysis_key, st.session_state.analysis_results, report_format.lower())
+    
+    data = report_cache.get(report_key)
+    job = st.session_state.report_job
+    if data is None and job is not None and job.label == report_key:
+        if job.status == Job.DONE:
+            st.session_state.report_job = None
+            data = job.result
+        elif job.status == Job.FAILED:
+            st.session_state.report_job = None
+            st.error(f"Error generating report: {job.error}")
+        else:
+            st.info(f"⏳ Generating {report_format} report...")
+            return
+    
+    if data is None:
+        if st.button(f"Generate {report_format} Report"):
+            session_id = st.session_state.session_id
+            images = {key: session_store.get_bytes(session_id, key) for key, _ in report.REPORT_IMAGES}
+            try:
+                st.session_state.report_job = report_queue.submit(
+                    generate_report, st.session_state.analysis_results, images,
+                    report_format.lower(), report_key, label=report_key,
+                )
+            except QueueFullError as e:
+                st.warning(str(e))
+            st.rerun()
+        return
+    
+    # Served from Streamlit's media endpoint rather than inlined into the page
+    st.download_button(
+        f"Download Results as {report_format}",
+        data=data,
+        file_name=f"khaire_health_report.{extension}",
+        mime=mime,
+    )
+
+def show_timing_breakdown():
+    rows = []
+    for key in ("upload_trace", "analysis_trace"):
+        trace = st.session_state.get(key)
+        if trace is None or trace.duration_ms is None:
+            continue
+        for span in trace.spans:
+            rows.append({
+                "Request": trace.name,
+                "Stage": span["name"] if span["parent"] is None else f"{span['parent']} › {span['name']}",
+                "Duration (ms)": span["duration_ms"],
+                "Details": ", ".join(f"{k}={v}" for k, v in span["attributes"].items()),
+                "Error": span["error"] or "",
+            })
+    if rows:
+        with st.expander("Timing Breakdown"):
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
 
 # Set page configuration
 st.set_page_config(
@@ -31,14 +292,18 @@ st.set_page_config(
 )
 
 # Initialize session state variables if they don't exist
-if 'uploaded_image' not in st.session_state:
-    st.session_state.uploaded_image = None
-if 'processed_image' not in st.session_state:
-    st.session_state.processed_image = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if 'analysis_results' not in st.session_state:
     st.session_state.analysis_results = None
 if 'show_results' not in st.session_state:
     st.session_state.show_results = False
+if 'analysis_job' not in st.session_state:
+    st.session_state.analysis_job = None
+if 'analysis_key' not in st.session_state:
+    st.session_state.analysis_key = None
+if 'report_job' not in st.session_state:
+    st.session_state.report_job = None
 
 # Main application header
 st.markdown("""
@@ -63,38 +328,103 @@ with col1:
         help="Upload a clear image of the retinal fundus taken with a smartphone camera or retinal imaging device."
     )
     
+    # Removing the upload abandons any analysis still running for it
+    if uploaded_file is None:
+        cancel_analysis_job()
+    
     # If an image is uploaded
     if uploaded_file is not None:
         try:
-            # Read and display the image
-            img = Image.open(uploaded_file)
+            # Decode once into every resolution the pipeline needs
+            upload = get_ingested_upload(uploaded_file)
     
-            if not verify_fundus(img):
+            upload_trace = st.session_state.upload_trace
+            image_quality = st.session_state.upload_quality
+            if not image_quality["is_suitable"]:
+                if upload_trace.duration_ms is None:
+                    upload_trace.finish()
+                st.error(f"❌ Image quality is too low for analysis ({image_quality['quality_score']}/100).")
+                for suggestion in image_quality["improvement_suggestions"]:
+                    st.markdown(f"- {suggestion}")
+                st.stop()
+            
+            if upload_trace.duration_ms is None:
+                with upload_trace.activate():
+                    is_fundus = verify_fundus(upload)
+                upload_trace.attributes["verified"] = is_fundus
+                upload_trace.finish()
+            else:
+                is_fundus = verify_fundus(upload)
+            
+            if not is_fundus:
                 st.error("❌ Not a valid fundus photo. Please upload a clear image.")
                 st.stop()
             
             st.success("✔️ Fundus image verified. Proceeding with diagnosis...")
-            image = Image.open(uploaded_file)
-            st.session_state.uploaded_image = image
-            st.image(image, caption="Uploaded Image", use_column_width=True)
+            preview = session_store.get_bytes(st.session_state.session_id, "preview")
+            if preview is not None:
+                st.image(preview, caption="Uploaded Image", use_container_width=True)
             
             # Process image button
-            if st.button("Analyze Image"):
-                with st.spinner("Processing image..."):
-                    # Preprocess the image
-                    processed_img = utils.preprocess_image(st.session_state.uploaded_image)
-                    st.session_state.processed_image = processed_img
-                    
-                    # Get predictions from model
-                    results = model.predict_health_conditions(processed_img)
-                    st.session_state.analysis_results = results
-                    st.session_state.show_results = True
-                    st.success("Analysis complete!")
+            job = st.session_state.analysis_job
+            if st.button("Analyze Image", disabled=job is not None):
+                trace = tracing.Trace("analysis", file_name=uploaded_file.name)
+                st.session_state.analysis_trace = trace
+                with trace.activate(), tracing.span("cache_lookup"):
+                    cache_key = make_cache_key(uploaded_file.getvalue(), model.get_model_versions())
+                    cached = result_cache.get(cache_key)
+                    tracing.set_attributes(hit=cached is not None)
+                st.session_state.analysis_key = cache_key
+                
+                if cached is not None:
+                    trace.finish()
+                    show_analysis(cached)
                     st.rerun()
+                
+                analysis_image = session_store.get_image(st.session_state.session_id, "analysis_image")
+                if analysis_image is None:
+                    # Evicted after the session sat idle; decode the upload again
+                    st.session_state.ingested_upload = None
+                    st.warning("This image has expired from your session. Please click Analyze Image again.")
+                else:
+                    try:
+                        job = job_queue.submit(
+                            run_analysis, analysis_image, cache_key, trace, image_quality,
+                            label=uploaded_file.name,
+                        )
+                        st.session_state.analysis_job = job
+                    except QueueFullError:
+                        st.error(
+                            f"⚠️ The analyzer is at capacity ({job_queue.pending} analyses are already waiting). "
+                            "Please try again in a few minutes."
+                        )
+            
+            # Pick up the background analysis once it finishes
+            if job is not None:
+                if job.status == Job.DONE:
+                    st.session_state.analysis_job = None
+                    show_analysis(job.result)
+                    st.rerun()
+                elif job.status == Job.FAILED:
+                    st.session_state.analysis_job = None
+                    st.error(f"Error processing image: {job.error}")
+                elif job.status == Job.CANCELLED:
+                    st.session_state.analysis_job = None
+                else:
+                    position = job_queue.position(job) if job.status == Job.PENDING else 0
+                    if position:
+                        wait = job_queue.estimated_wait(job)
+                        estimate = f", about {wait:.0f}s to go" if wait is not None else ""
+                        st.info(f"⏳ Waiting in line: position {position} of {job_queue.pending}{estimate}... ({job.elapsed:.0f}s)")
+                    else:
+                        st.info(f"⏳ Processing image... ({job.elapsed:.0f}s)")
+                    if st.button("Cancel Analysis"):
+                        cancel_analysis_job()
+                        st.rerun()
         
         except Exception as e:
             st.error(f"Error processing image: {e}")
-            st.session_state.uploaded_image = None
+            st.session_state.ingested_upload = None
 
     # Display guidelines
     with st.expander("Image Guidelines"):
@@ -110,15 +440,24 @@ with col2:
         st.markdown("## Analysis Results")
         
         # Display the processed image if available
-        if st.session_state.processed_image is not None:
+        processed_image = session_store.get_bytes(st.session_state.session_id, "processed_image")
+        if processed_image is not None:
             st.image(
-                st.session_state.processed_image, 
+                processed_image, 
                 caption="Processed Retinal Image", 
-                use_column_width=True
+                use_container_width=True
             )
         
         results = st.session_state.analysis_results
         
+        image_quality = results.get("image_quality") or {}
+        if "quality_score" in image_quality:
+            st.caption(f"Image quality: {image_quality['quality_score']}/100")
+        
+        if results.get("model_errors"):
+            failed = ", ".join(sorted(results["model_errors"]))
+            st.warning(f"⚠️ Some assessments could not be completed ({failed}). Results for these are unavailable.")
+        
         # Create tabs for different categories of results
         tab1, tab2, tab3 = st.tabs(["Health Risks", "Ocular Conditions", "Demographics"])
         
@@ -175,9 +514,10 @@ with col2:
             glaucoma_ratio = glaucoma.get("cup_to_disc_ratio", "N/A")
             
             # Display the glaucoma-processed image with optic cup detection
-            if "processed_image" in glaucoma and glaucoma["processed_image"] is not None:
+            roi_overlay = session_store.get_bytes(st.session_state.session_id, "roi_overlay")
+            if roi_overlay is not None:
                 st.image(
-                    glaucoma["processed_image"], 
+                    roi_overlay, 
                     caption="Optic Cup Detection", 
                     use_container_width=True
                 )
@@ -242,6 +582,10 @@ with col2:
             ethnicity_confidence = demographics.get("ethnicity_confidence", 0)
             st.markdown(f"**Predicted Ethnicity**: {ethnicity} (Confidence: {ethnicity_confidence:.1f}%)")
         
+        # Per-stage timings for the upload and analysis behind these results
+        if SHOW_TIMINGS:
+            show_timing_breakdown()
+        
         # Important disclaimer
         st.markdown("---")
         st.markdown("""
@@ -252,12 +596,7 @@ with col2:
         """)
         
         # Option to download results
-        if st.button("Download Results as PDF"):
-            with st.spinner("Generating PDF..."):
-                # Simulate PDF generation
-                time.sleep(2)
-                st.success("PDF report generated!")
-                # In a real implementation, generate a PDF and provide download link
+        show_report_export()
     
     else:
         # Show introductory content when no analysis is being displayed
@@ -292,3 +631,11 @@ st.markdown("""
     <p>© 2023 Khaire Health | <a href="/privacy">Privacy Policy</a> | <a href="/about">About</a> | <a href="/info">Health Information</a></p>
 </div>
 """, unsafe_allow_html=True)
+
+show_session_memory()
+
+# Poll running jobs; the rest of the page has already been rendered
+running = [st.session_state.analysis_job, st.session_state.report_job]
+if any(job is not None and not job.finished for job in running):
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
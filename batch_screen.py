@@ -0,0 +1,298 @@
+"""
+Headless batch screening of fundus image directories.
+
+Runs the same pipeline as the Streamlit app (verification, preprocessing,
+ROI detection and condition prediction) over every image in a directory and
+writes one JSON record per image.
+
+Usage:
+    python batch_screen.py IMAGE_DIR --output results.jsonl --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from PIL import Image
+
+import utils
+import verifier
+from ingest import ingest_upload
+from quality import assess_image_quality
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def find_images(input_dir, recursive=False):
+    """
+    List image files under a directory.
+
+    Args:
+        input_dir (str): Directory to scan
+        recursive (bool): Whether to descend into subdirectories
+
+    Returns:
+        list: Sorted image file paths
+    """
+    paths = []
+    if recursive:
+        for root, _, files in os.walk(input_dir):
+            paths.extend(os.path.join(root, name) for name in files)
+    else:
+        paths = [os.path.join(input_dir, name) for name in os.listdir(input_dir)]
+    return sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p))
+
+
+def _read_upload(path):
+    with open(path, "rb") as f:
+        return ingest_upload(f.read())
+
+
+def load_for_verification(path):
+    """
+    Decode an image and prepare its quality assessment and verifier input.
+
+    Runs in a worker process, so only small arrays are returned; the
+    analysis image is rebuilt by ``analyze_image`` in whichever worker
+    analyzes it.
+
+    Args:
+        path (str): Image file path
+
+    Returns:
+        dict: Quality assessment, verifier input and original size, or an
+            error message
+    """
+    try:
+        upload = _read_upload(path)
+        image_quality = assess_image_quality(upload.verifier_thumbnail)
+        record = {"path": path, "size": upload.original_size, "quality": image_quality, "error": None}
+        if image_quality["is_suitable"]:
+            # Unsuitable images are never verified, so skip building their input
+            record["verifier_input"] = upload.verifier_input
+        return record
+    except Exception as e:
+        return {"path": path, "error": f"Error loading image: {e}"}
+
+
+def analyze_image(path, overlay_dir=None, image_quality=None):
+    """
+    Preprocess a verified image and run condition prediction on it.
+
+    Runs in a worker process. The image is decoded again here rather than
+    shipped between processes: draft-mode JPEG decoding is cheaper than
+    pickling the preprocessed frame to the main process and back.
+
+    Args:
+        path (str): Image file path, also used to name the overlay file
+        overlay_dir (str): Optional directory for optic cup overlay images
+        image_quality (dict): Quality assessment made when the image was loaded
+
+    Returns:
+        dict: JSON-serializable analysis results
+    """
+    # Imported here so the main process never pays for the condition models
+    import model
+
+    processed = utils.preprocess_image(_read_upload(path).analysis_image)
+    results = model.predict_health_conditions(processed, image_quality=image_quality)
+
+    overlay = results.get("glaucoma", {}).pop("processed_image", None)
+    if overlay_dir and overlay is not None:
+        name = os.path.splitext(os.path.basename(path))[0] + "_roi.jpg"
+        overlay.save(os.path.join(overlay_dir, name), format="JPEG")
+
+    return _to_json_safe(results)
+
+
+def _to_json_safe(value):
+    if isinstance(value, dict):
+        return {k: _to_json_safe(v) for k, v in value.items() if not isinstance(v, Image.Image)}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_safe(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ProgressReporter:
+    """Print a single updating progress line with throughput to stderr."""
+
+    def __init__(self, total, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.done = 0
+        self.verified = 0
+        self.failed = 0
+        self.start_time = time.perf_counter()
+
+    def update(self, record):
+        self.done += 1
+        if record.get("error"):
+            self.failed += 1
+        elif record.get("verified"):
+            self.verified += 1
+        elapsed = time.perf_counter() - self.start_time
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        self.stream.write(f"\r[{self.done}/{self.total}] {rate:.1f} images/s")
+        self.stream.flush()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            "images": self.done,
+            "verified": self.verified,
+            "rejected": self.done - self.verified - self.failed,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(self.done / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+def screen_images(paths, fundus_model, pool, write_record, batch_size=32, max_in_flight=64, overlay_dir=None):
+    """
+    Screen images through the full pipeline.
+
+    Decoding runs in ``pool``; verifier calls run in this process in batches
+    of ``batch_size``; each verified image is then preprocessed and analyzed
+    by a single ``pool`` task. At most ``max_in_flight`` tasks are queued per
+    stage.
+
+    Args:
+        paths (list): Image file paths
+        fundus_model: Loaded verifier model
+        pool (concurrent.futures.Executor): Worker pool
+        write_record (callable): Called with one result dict per image
+        batch_size (int): Verifier batch size
+        max_in_flight (int): Bound on queued decode and analysis tasks
+        overlay_dir (str): Optional directory for optic cup overlay images
+    """
+    path_iter = iter(paths)
+    decoding = deque()
+    analyzing = {}
+    batch = []
+
+    def fill_decode_queue():
+        while len(decoding) < max_in_flight:
+            path = next(path_iter, None)
+            if path is None:
+                return
+            decoding.append(pool.submit(load_for_verification, path))
+
+    def collect_analyses(block):
+        if not analyzing:
+            return
+        done, _ = wait(analyzing, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            record = analyzing.pop(future)
+            try:
+                record["results"] = future.result()
+            except Exception as e:
+                record["error"] = f"Error in analysis: {e}"
+            write_record(record)
+
+    def flush_batch():
+        scores = verifier.score_fundus_batch(fundus_model, [item["verifier_input"] for item in batch])
+        for item, score in zip(batch, scores):
+            record = {
+                "path": item["path"],
+                "width": item["size"][0],
+                "height": item["size"][1],
+                "verifier_score": float(score),
+                "verified": bool(score >= verifier.VERIFIER_THRESHOLD),
+                "error": None,
+            }
+            if not record["verified"]:
+                write_record(record)
+                continue
+            while len(analyzing) >= max_in_flight:
+                collect_analyses(block=True)
+            future = pool.submit(analyze_image, item["path"], overlay_dir, item["quality"])
+            analyzing[future] = record
+        batch.clear()
+
+    fill_decode_queue()
+    while decoding:
+        item = decoding.popleft().result()
+        fill_decode_queue()
+
+        if item["error"]:
+            write_record({"path": item["path"], "verified": False, "error": item["error"]})
+        elif not item["quality"]["is_suitable"]:
+            # Rejected before reaching the verifier
+            write_record({
+                "path": item["path"],
+                "width": item["size"][0],
+                "height": item["size"][1],
+                "verified": False,
+                "quality": item["quality"],
+                "error": None,
+            })
+        else:
+            batch.append(item)
+
+        if len(batch) >= batch_size or (batch and not decoding):
+            flush_batch()
+        collect_analyses(block=False)
+
+    while analyzing:
+        collect_analyses(block=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Screen a directory of retinal fundus images.")
+    parser.add_argument("input_dir", help="Directory containing fundus images")
+    parser.add_argument("-o", "--output", default="screening_results.jsonl", help="JSONL file for result records")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for decoding and analysis")
+    parser.add_argument("-b", "--batch-size", type=int, default=32, help="Verifier batch size")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Include images in subdirectories")
+    parser.add_argument("--overlay-dir", help="Save optic cup detection overlays to this directory")
+    parser.add_argument("--verifier-model", help="Path to the fundus verifier model (default: the registered model)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    paths = find_images(args.input_dir, recursive=args.recursive)
+    if not paths:
+        print(f"No images found in {args.input_dir}", file=sys.stderr)
+        return 1
+
+    if args.overlay_dir:
+        os.makedirs(args.overlay_dir, exist_ok=True)
+
+    fundus_model = verifier.load_fundus_model(args.verifier_model)
+    progress = ProgressReporter(len(paths))
+
+    # Spawned rather than forked: the verifier has already loaded TensorFlow
+    # in this process, and forking a process with TensorFlow's threads
+    # running can deadlock the workers
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    with open(args.output, "w") as out, pool:
+        def write_record(record):
+            out.write(json.dumps(record) + "\n")
+            progress.update(record)
+
+        screen_images(
+            paths,
+            fundus_model,
+            pool,
+            write_record,
+            batch_size=args.batch_size,
+            max_in_flight=max(args.workers * 4, args.batch_size),
+            overlay_dir=args.overlay_dir,
+        )
+
+    print(file=sys.stderr)
+    print(json.dumps(progress.summary(), indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
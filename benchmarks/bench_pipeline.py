@@ -0,0 +1,268 @@
+"""
+Microbenchmarks for every stage of the analysis pipeline.
+
+Times each stage on synthetic fundus images at several resolutions and
+records latency percentiles and peak memory. Peak memory is how far one run
+of the stage raises the resident set size, measured in a fresh interpreter,
+so it includes the native buffers of PIL, OpenCV and NumPy. It needs Linux's
+/proc/self/clear_refs and is null elsewhere. Results are written as JSON
+tagged with the current commit so runs can be compared across commits.
+When the verifier model file or TensorFlow is unavailable, a stub model is
+used so the suite still runs offline.
+
+Usage:
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 512 1024 --stages preprocess roi_process
+    python benchmarks/bench_pipeline.py --compare baseline.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import encode_jpeg, make_synthetic_fundus  # noqa: E402
+
+DEFAULT_SIZES = (512, 1024, 2048, 4096)
+
+
+class StubVerifier:
+    """Stands in for the Keras verifier when the model file is missing."""
+
+    is_stub = True
+
+    def predict_on_batch(self, batch):
+        # Cheap, deterministic score with the verifier's output shape
+        return batch.mean(axis=(1, 2, 3)).reshape(-1, 1)
+
+
+def load_verifier_model():
+    """Return the real verifier if it can be loaded, otherwise a stub."""
+    from model_registry import registry
+    from verifier import VERIFIER_MODEL_NAME
+
+    try:
+        return registry.get(VERIFIER_MODEL_NAME)
+    except Exception as e:
+        print(f"Using stub verifier ({e})", file=sys.stderr)
+        return StubVerifier()
+
+
+def build_stages(verifier_model):
+    """
+    Define the benchmarked stages.
+
+    Each stage has a ``setup(array, jpeg_bytes)`` that builds its input
+    outside the timed region and a ``run(input)`` that is timed.
+
+    Returns:
+        dict: Stage name -> (setup, run, default iteration count)
+    """
+    import model
+    import utils
+    import verifier
+    from image_buffer import ImageBuffer
+    from ingest import ingest_upload
+    from roi_detector import ROIDetector
+
+    scheduler = verifier.create_verifier_scheduler(verifier_model)
+
+    def loaded_detector(array, _):
+        detector = ROIDetector()
+        detector.load_image(ImageBuffer(array))
+        return detector
+
+    def bgr_frame(array, _):
+        return np.ascontiguousarray(array[:, :, ::-1])
+
+    return {
+        "ingest": (lambda a, jpeg: jpeg, ingest_upload, 20),
+        "preprocess": (lambda a, _: Image.fromarray(a), utils.preprocess_image, 20),
+        "verify": (lambda a, _: ImageBuffer(a), lambda img: verifier.verify_fundus(img, scheduler), 20),
+        "roi_load": (lambda a, _: Image.fromarray(a), lambda img: ROIDetector().load_image(img), 20),
+        "roi_process": (loaded_detector, lambda d: d.process_image(), 10),
+        "roi_cv2_to_pil": (bgr_frame, lambda frame: ROIDetector().cv2_to_pil(frame), 20),
+        # Includes the simulated one-second model call, so few iterations
+        "predict": (lambda a, _: utils.preprocess_image(Image.fromarray(a)), model.predict_health_conditions, 3),
+        "download_link": (lambda a, _: Image.fromarray(a), lambda img: utils.get_image_download_link(img, "x.jpg", "x"), 10),
+    }
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000
+
+
+def _proc_status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def _memory_probe(stage, size):
+    """
+    Run one stage once in this (fresh) process and return its peak RSS rise in MB.
+
+    A warmup run first loads lazy imports and models. The kernel's peak RSS
+    counter is then reset so the measured run is the only thing it covers.
+
+    Returns:
+        float: Peak resident memory above the level before the run, or None
+            without /proc/self/clear_refs
+    """
+    setup, run, _ = build_stages(load_verifier_model())[stage]
+    array = make_synthetic_fundus(size)
+    jpeg_bytes = encode_jpeg(array)
+    run(setup(array, jpeg_bytes))
+    stage_input = setup(array, jpeg_bytes)
+    gc.collect()
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = _proc_status_mb("VmRSS")
+    except OSError:
+        return None
+    run(stage_input)
+    return round(_proc_status_mb("VmHWM") - before, 2)
+
+
+def measure_peak_memory(stage, size):
+    """
+    Measure a stage's peak memory in a fresh interpreter.
+
+    A separate process keeps earlier stages' peaks and retained buffers out
+    of the reading.
+
+    Returns:
+        float: Peak RSS rise in MB, or None if it could not be measured
+    """
+    # A fixed glibc mmap threshold stops malloc from keeping the warmup run's
+    # large buffers around for reuse, which would hide them from the reading
+    env = dict(os.environ, MALLOC_MMAP_THRESHOLD_="131072")
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--memory-probe", stage, str(size)],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        print(f"Memory probe for {stage} at {size}px failed: {proc.stderr.strip()}", file=sys.stderr)
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_stage(setup, run, array, jpeg_bytes, iterations, warmup=1):
+    """
+    Time one stage.
+
+    Returns:
+        dict: Latency percentiles in milliseconds
+    """
+    for _ in range(warmup):
+        run(setup(array, jpeg_bytes))
+
+    timings = []
+    for _ in range(iterations):
+        stage_input = setup(array, jpeg_bytes)
+        start = time.perf_counter()
+        run(stage_input)
+        timings.append(time.perf_counter() - start)
+
+
+    return {
+        "iterations": iterations,
+        "mean_ms": round(float(np.mean(timings)) * 1000, 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p90_ms": round(percentile(timings, 90), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    """Print the p50 change of each stage against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["stage"], r["size"]): r for r in baseline["results"]}
+
+    print(f"\nvs {baseline_path} ({baseline.get('commit')})")
+    for result in current["results"]:
+        before = previous.get((result["stage"], result["size"]))
+        if before is None:
+            continue
+        change = (result["p50_ms"] - before["p50_ms"]) / max(before["p50_ms"], 1e-9) * 100
+        print(f"{result['stage']:<16} {result['size']:>5}px  {before['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the fundus analysis pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Image sizes in pixels")
+    parser.add_argument("--stages", nargs="+", help="Only run these stages")
+    parser.add_argument("--iterations", type=int, help="Override every stage's iteration count")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--memory-probe", nargs=2, metavar=("STAGE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.memory_probe:
+        stage, size = args.memory_probe
+        print(json.dumps(_memory_probe(stage, int(size))))
+        return 0
+
+    verifier_model = load_verifier_model()
+    stages = build_stages(verifier_model)
+    selected = args.stages or list(stages)
+    unknown = set(selected) - set(stages)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    results = []
+    for size in args.sizes:
+        array = make_synthetic_fundus(size)
+        jpeg_bytes = encode_jpeg(array)
+        for name in selected:
+            setup, run, iterations = stages[name]
+            result = bench_stage(setup, run, array, jpeg_bytes, args.iterations or iterations)
+            result.update({"stage": name, "size": size, "peak_mb": measure_peak_memory(name, size)})
+            results.append(result)
+            peak = "n/a" if result["peak_mb"] is None else f"{result['peak_mb']:8.2f} MB"
+            print(f"{name:<16} {size:>5}px  p50 {result['p50_ms']:9.2f} ms  p99 {result['p99_ms']:9.2f} ms  peak {peak}")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "stub_verifier": getattr(verifier_model, "is_stub", False),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Regression check for the tiled optic cup search.
+
+Runs ``measure_cup_tiled`` on synthetic frames with several bright regions
+and checks that it finds the same padded bbox and cup-to-disc ratio as a
+plain full-frame ``measure_cup``. The coarse-to-fine search is approximate
+by design and is not checked here. Exits 1 on any mismatch, so it can run
+in CI.
+
+Usage:
+    python benchmarks/check_roi.py
+    python benchmarks/check_roi.py --seeds 100 --size 2400
+"""
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import roi_detector  # noqa: E402
+from synthetic import make_multi_blob_frame  # noqa: E402
+
+# Tile memory caps to check: the default, and one small enough to force many tiles
+MEMORY_CAPS = (None, 2 * 1024 * 1024)
+
+
+def _summary(cup):
+    return None if cup is None else (tuple(cup[0]), round(cup[2], 9))
+
+
+def check_frame(image):
+    """
+    Compare the tiled search at each memory cap against the full-frame result.
+
+    Returns:
+        list: (variant, expected, got) for each mismatch
+    """
+    expected = _summary(roi_detector.measure_cup(roi_detector._threshold_rgb(image)))
+    variants = {
+        f"tiled(memory_cap={cap})": lambda cap=cap: roi_detector.measure_cup_tiled(image, memory_cap=cap)
+        for cap in MEMORY_CAPS
+    }
+
+    mismatches = []
+    for name, search in variants.items():
+        got = _summary(search())
+        if got != expected:
+            mismatches.append((name, expected, got))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the tiled optic cup search matches the full-frame one.")
+    parser.add_argument("--seeds", type=int, default=20, help="Number of synthetic frames")
+    parser.add_argument("--size", type=int, default=1800, help="Frame size in pixels")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for seed in range(args.seeds):
+        for name, expected, got in check_frame(make_multi_blob_frame(args.size, seed)):
+            failures += 1
+            print(f"seed {seed} {name}: expected {expected}, got {got}")
+    print(f"{args.seeds} frames checked, {failures} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Cold-start import benchmark.
+
+Imports each module (or runs each page script) in a fresh interpreter and
+records how long it takes, so regressions that drag TensorFlow or OpenCV
+back into page load show up immediately.
+
+Usage:
+    python benchmarks/import_time.py --repeat 5 --output import_times.json
+    python benchmarks/import_time.py --budget 1.0   # exit 1 if any target is slower
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules imported by the app and pages at startup
+MODULE_TARGETS = ["model_info", "model", "utils", "verifier", "ingest", "result_cache"]
+
+# Page scripts run in Streamlit's bare mode (no server)
+PAGE_TARGETS = ["pages/privacy.py", "pages/info.py", "pages/about.py"]
+
+_MODULE_SNIPPET = """
+import time
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+import sys
+print(elapsed, "tensorflow" in sys.modules, "cv2" in sys.modules)
+"""
+
+_PAGE_SNIPPET = """
+import time, runpy, logging
+logging.disable(logging.WARNING)
+start = time.perf_counter()
+runpy.run_path({target!r}, run_name="__main__")
+elapsed = time.perf_counter() - start
+import sys
+print(elapsed, "tensorflow" in sys.modules, "cv2" in sys.modules)
+"""
+
+
+def measure(target, repeat=3):
+    """
+    Time a cold import of one target in fresh interpreters.
+
+    Args:
+        target (str): Module name, or a path to a page script
+        repeat (int): Number of fresh interpreters to start
+
+    Returns:
+        dict: Median and individual timings in seconds, and whether
+            TensorFlow or OpenCV ended up imported
+    """
+    if target.endswith(".py"):
+        snippet = _PAGE_SNIPPET.format(target=target)
+    else:
+        snippet = _MODULE_SNIPPET.format(target=target)
+
+    timings = []
+    loads_tensorflow = loads_cv2 = False
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", snippet],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            return {"target": target, "error": proc.stderr.strip().splitlines()[-1:]}
+        elapsed, has_tf, has_cv2 = proc.stdout.strip().splitlines()[-1].split()
+        timings.append(float(elapsed))
+        loads_tensorflow = has_tf == "True"
+        loads_cv2 = has_cv2 == "True"
+
+    return {
+        "target": target,
+        "median_seconds": round(statistics.median(timings), 4),
+        "timings_seconds": [round(t, 4) for t in timings],
+        "loads_tensorflow": loads_tensorflow,
+        "loads_cv2": loads_cv2,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of app modules and pages.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per target")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--budget", type=float, help="Fail if any target's median exceeds this many seconds")
+    parser.add_argument("targets", nargs="*", help="Modules or page scripts (default: all)")
+    args = parser.parse_args(argv)
+
+    targets = args.targets or MODULE_TARGETS + PAGE_TARGETS
+    results = [measure(target, args.repeat) for target in targets]
+
+    for result in results:
+        if "error" in result:
+            print(f"{result['target']:<22} ERROR {result['error']}")
+        else:
+            flags = ", ".join(name for name, key in (("tensorflow", "loads_tensorflow"), ("cv2", "loads_cv2")) if result[key])
+            print(f"{result['target']:<22} {result['median_seconds'] * 1000:8.1f} ms  {flags}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version, "results": results}, f, indent=2)
+
+    if args.budget is not None:
+        slow = [r for r in results if "error" in r or r["median_seconds"] > args.budget]
+        if slow:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+Concurrent-session load test for app.py.
+
+Drives simulated users through the real upload -> verify -> analyze ->
+results flow with Streamlit's headless AppTest, ramping the number of
+concurrent sessions. All sessions run in this process, so they share the
+app's cached resources (verifier scheduler, job queue, caches and session
+store) exactly as the sessions of one server replica do. Each session
+uploads a different synthetic image, so the result and verification caches
+never short-circuit the work.
+
+For every concurrency level the report gives throughput, p50/p95/p99
+latency of each stage (the user-visible page load, upload and analyze
+steps, plus the
+app's own trace spans: decode, quality, verify, preprocess, predict) and
+resident memory growth.
+
+Running AppTest sessions side by side in threads relies on Streamlit
+internals (see ``allow_concurrent_app_tests``), so the harness is pinned to
+the Streamlit release it was checked against, TESTED_STREAMLIT_VERSION. It
+refuses to run on another release, or when an internal it patches is
+missing, unless --untested-streamlit is given. The verifier is
+the registry's model unless --stub-models is given or it cannot be loaded;
+the condition models are the placeholders in model.py, whose latency can be
+set with --model-latency.
+
+Usage:
+    pip install streamlit==1.65.0
+    python benchmarks/load_app.py --concurrency 1 2 4 8 --output load.json
+    python benchmarks/load_app.py --stub-models --model-latency 0.2 --sessions-per-level 3
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import git_commit  # noqa: E402
+from synthetic import encode_jpeg, make_synthetic_fundus  # noqa: E402
+
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+DEFAULT_CONCURRENCY = (1, 2, 4, 8)
+# Streamlit release whose private AppTest and Runtime internals the harness patches
+TESTED_STREAMLIT_VERSION = "1.65.0"
+
+# Stages reported from the app's traces: (trace key in session state, span name)
+TRACE_STAGES = [
+    ("upload_trace", "decode"),
+    ("upload_trace", "quality"),
+    ("upload_trace", "verify"),
+    ("analysis_trace", "preprocess"),
+    ("analysis_trace", "predict"),
+]
+
+
+class AcceptingStubVerifier:
+    """Stands in for the verifier; accepts every image at negligible cost."""
+
+    is_stub = True
+
+    def predict_on_batch(self, batch):
+        return np.ones((len(batch), 1), dtype=np.float32)
+
+
+def check_streamlit_internals(allow_untested=False):
+    """
+    Check that this Streamlit has the internals ``allow_concurrent_app_tests`` patches.
+
+    Raises:
+        RuntimeError: Naming the installed release and what is missing, if
+            it is not the tested release (unless ``allow_untested``) or any
+            patched internal is gone
+    """
+    import streamlit
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.testing.v1 import app_test, element_tree
+
+    fix = f"Install the tested release with: pip install streamlit=={TESTED_STREAMLIT_VERSION}"
+    if streamlit.__version__ != TESTED_STREAMLIT_VERSION and not allow_untested:
+        raise RuntimeError(
+            f"load_app.py patches Streamlit internals and is pinned to streamlit "
+            f"{TESTED_STREAMLIT_VERSION}, found {streamlit.__version__}. {fix}, "
+            f"or pass --untested-streamlit to try anyway."
+        )
+
+    missing = []
+    if not isinstance(getattr(Runtime, "_instance", False), (Runtime, type(None))):
+        missing.append("Runtime._instance")
+    if not hasattr(PagesManager, "uses_pages_directory"):
+        missing.append("PagesManager.uses_pages_directory")
+    if getattr(app_test, "PagesManager", None) is not PagesManager:
+        missing.append("streamlit.testing.v1.app_test.PagesManager")
+    if "_files" not in getattr(element_tree.FileUploader, "__annotations__", {}):
+        missing.append("FileUploader._files")
+    if missing:
+        raise RuntimeError(
+            f"streamlit {streamlit.__version__} lacks internals load_app.py patches: "
+            f"{', '.join(missing)}. {fix}."
+        )
+
+
+def allow_concurrent_app_tests():
+    """
+    Let AppTest runs overlap in threads.
+
+    AppTest installs a stand-in Runtime as the global singleton, and turns
+    on the global.appTest option, for the length of each run and undoes
+    both afterwards, so a session finishing would pull them out from under
+    sessions still running. The singleton lookup is patched to fall back to
+    the last stand-in seen, and the option is set for the whole process so
+    every run restores it to on.
+
+    Each run also clears the class-wide "app has a pages/ directory" flag;
+    a run that reads it while cleared hashes its widgets differently, so
+    the uploader comes back as a new, empty widget. The flag is set once
+    and AppTest is given a subclass whose copy it can clear freely.
+
+    Call ``check_streamlit_internals`` first; these are private APIs.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.testing.v1 import app_test
+
+    PagesManager.uses_pages_directory = os.path.isdir(os.path.join(REPO_ROOT, "pages"))
+    app_test.PagesManager = type("PagesManager", (PagesManager,), {})
+
+    last_seen = [None]
+
+    def instance(cls):
+        runtime = cls._instance
+        if runtime is None:
+            runtime = last_seen[0]
+            if runtime is None:
+                raise RuntimeError("Runtime hasn't been created!")
+        last_seen[0] = runtime
+        return runtime
+
+    def exists(cls):
+        return cls._instance is not None or last_seen[0] is not None
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+    # Magic rewrites the script's AST on every run, and compiling AST objects
+    # from several threads at once trips CPython's recursion-depth check;
+    # app.py does not rely on magic
+    from streamlit import config
+
+    config.set_option("runner.magicEnabled", False)
+    config.set_option("global.appTest", True)
+
+
+def configure_models(stub_models, model_latency):
+    """
+    Choose the verifier and placeholder latency used by the sessions.
+
+    Returns:
+        bool: True if the stub verifier is in use
+    """
+    import model
+    import verifier
+    from model_registry import registry
+
+    if model_latency is not None:
+        model.SIMULATED_MODEL_LATENCY = model_latency
+
+    if not stub_models:
+        try:
+            registry.get(verifier.VERIFIER_MODEL_NAME)
+            return False
+        except Exception as e:
+            print(f"Using stub verifier ({e})", file=sys.stderr)
+
+    stub = AcceptingStubVerifier()
+    # The app's scheduler resolves the verifier through this function per batch
+    verifier._predict_with_registry_model = stub.predict_on_batch
+    # Nothing to preload, and a warmup thread would try the real model files
+    os.environ["KHAIRE_PRELOAD_MODELS"] = "0"
+    return True
+
+
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        # Peak rather than current RSS; ru_maxrss is KB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def _find_button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    return None
+
+
+def _run_with_upload(at, upload):
+    # AppTest otherwise re-derives the uploader's files from session state on
+    # each run, which now and then comes back empty while runs overlap in
+    # threads; pass the same file (same id) every time, as a browser does
+    at.file_uploader[0]._files = [upload]
+    at.run()
+
+
+def _span_durations(at):
+    durations = {}
+    for trace_key, span_name in TRACE_STAGES:
+        trace = at.session_state[trace_key] if trace_key in at.session_state else None
+        if trace is None:
+            continue
+        for span in trace.spans:
+            if span["name"] == span_name and span["parent"] is None:
+                durations[span_name] = span["duration_ms"] / 1000
+    return durations
+
+
+def run_session(session_index, image_size, timeout):
+    """
+    Take one simulated user from upload to results.
+
+    Args:
+        session_index (int): Used as the image seed and file id, so every
+            session uploads a different image
+        image_size (int): Width and height of the uploaded image in pixels
+        timeout (float): Longest a single AppTest run may take, in seconds
+
+    Returns:
+        dict: Stage latencies in seconds, and an "error" message if the
+            flow did not reach the results
+    """
+    from streamlit.testing.v1 import AppTest
+
+    data = encode_jpeg(make_synthetic_fundus(image_size, seed=session_index))
+    timings = {}
+    start = time.perf_counter()
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        stage_start = time.perf_counter()
+        at.run()
+        timings["page_load"] = time.perf_counter() - stage_start
+        if at.exception:
+            return {"error": at.exception[0].message, **timings}
+
+        # Upload: decode, quality gate and verification run in one script run
+        upload = (f"load-{session_index}", f"fundus_{session_index}.jpg", data, "image/jpeg")
+        stage_start = time.perf_counter()
+        _run_with_upload(at, upload)
+        timings["upload"] = time.perf_counter() - stage_start
+        if at.exception:
+            return {"error": at.exception[0].message, **timings}
+        analyze = _find_button(at, "Analyze Image")
+        if analyze is None:
+            errors = [e.value for e in at.error]
+            return {"error": errors[0] if errors else "Upload was not accepted", **timings}
+
+        # Analyze: the app polls the job with reruns until the results render.
+        # A run can also end with the job still going, as when a browser
+        # reconnects; the next run picks the polling up again.
+        stage_start = time.perf_counter()
+        analyze.click()
+        _run_with_upload(at, upload)
+        deadline = stage_start + timeout
+        while (not at.exception and not at.session_state["show_results"]
+               and at.session_state["analysis_job"] is not None and time.perf_counter() < deadline):
+            _run_with_upload(at, upload)
+        timings["analyze"] = time.perf_counter() - stage_start
+        if at.exception:
+            return {"error": at.exception[0].message, **timings}
+        if not at.session_state["show_results"]:
+            messages = [m.value for m in list(at.error) + list(at.warning)]
+            return {"error": messages[0] if messages else "Results were not shown", **timings}
+
+        timings.update(_span_durations(at))
+        timings["end_to_end"] = time.perf_counter() - start
+        return timings
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", **timings}
+
+
+def summarize(values):
+    values = np.asarray(values) * 1000
+    return {
+        "count": int(values.size),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def run_level(concurrency, sessions, first_index, image_size, timeout):
+    """
+    Run ``sessions`` simulated users with ``concurrency`` of them active at once.
+
+    Returns:
+        dict: Throughput, per-stage latency summaries, errors and memory
+    """
+    rss_before = rss_mb()
+    peak_rss = [rss_before]
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.wait(0.2):
+            peak_rss[0] = max(peak_rss[0], rss_mb())
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(
+            lambda i: run_session(i, image_size, timeout),
+            range(first_index, first_index + sessions),
+        ))
+    wall = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+
+    completed = [o for o in outcomes if "error" not in o]
+    errors = sorted({o["error"] for o in outcomes if "error" in o})
+    stage_names = ["page_load", "upload", "analyze", "end_to_end"] + [span for _, span in TRACE_STAGES]
+    stages = {}
+    for name in stage_names:
+        values = [o[name] for o in completed if name in o]
+        if values:
+            stages[name] = summarize(values)
+
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "completed": len(completed),
+        "failed": sessions - len(completed),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_per_min": round(len(completed) / wall * 60, 2) if wall > 0 else None,
+        "stages": stages,
+        "rss_before_mb": round(rss_before, 1),
+        "rss_after_mb": round(rss_mb(), 1),
+        "rss_peak_mb": round(peak_rss[0], 1),
+    }
+
+
+def print_level(result):
+    print(
+        f"\nconcurrency {result['concurrency']:>3}: {result['completed']}/{result['sessions']} completed in "
+        f"{result['wall_s']:.1f}s ({result['throughput_per_min']} sessions/min), "
+        f"RSS {result['rss_before_mb']:.0f} -> {result['rss_after_mb']:.0f} MB (peak {result['rss_peak_mb']:.0f} MB)"
+    )
+    for name, stats in result["stages"].items():
+        print(f"  {name:<12} p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms")
+    for error in result["errors"]:
+        print(f"  error: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test app.py with concurrent simulated sessions.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY),
+                        help="Concurrent sessions at each step of the ramp")
+    parser.add_argument("--sessions-per-level", type=int, default=2,
+                        help="Sessions run at each level, as a multiple of its concurrency")
+    parser.add_argument("--image-size", type=int, default=1024, help="Uploaded image size in pixels")
+    parser.add_argument("--stub-models", action="store_true", help="Use a stub verifier instead of the real model")
+    parser.add_argument("--model-latency", type=float, help="Latency of each placeholder condition model, in seconds")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Longest one script run may take, in seconds")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--untested-streamlit", action="store_true",
+                        help=f"Run on a Streamlit release other than {TESTED_STREAMLIT_VERSION}")
+    args = parser.parse_args(argv)
+
+    try:
+        check_streamlit_internals(allow_untested=args.untested_streamlit)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    import model
+
+    # Deprecation warnings are logged once per script run and drown the report
+    logging.disable(logging.WARNING)
+    allow_concurrent_app_tests()
+    stub_verifier = configure_models(args.stub_models, args.model_latency)
+    # One session on its own first, so cached resources are created and the
+    # first level does not pay for them
+    warmup = run_session(0, args.image_size, args.timeout)
+    if "error" in warmup:
+        print(f"Warmup session failed: {warmup['error']}", file=sys.stderr)
+        return 1
+
+    results = []
+    next_index = 1
+    for concurrency in args.concurrency:
+        sessions = concurrency * args.sessions_per_level
+        result = run_level(concurrency, sessions, next_index, args.image_size, args.timeout)
+        next_index += sessions
+        results.append(result)
+        print_level(result)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "image_size": args.image_size,
+        "stub_verifier": stub_verifier,
+        "model_latency_s": model.SIMULATED_MODEL_LATENCY,
+        "analysis_workers": int(os.environ.get("KHAIRE_ANALYSIS_WORKERS", "4")),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(r["failed"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
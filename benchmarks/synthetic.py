@@ -0,0 +1,101 @@
+"""Synthetic fundus-like test images for benchmarks and load tests."""
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def make_synthetic_fundus(size, seed=0):
+    """
+    Generate an RGB image that looks enough like a fundus photo to exercise
+    the pipeline: a dark surround, an orange-red retinal disc with radial
+    falloff, a bright optic disc, a few dark vessels and sensor noise.
+
+    Args:
+        size (int): Width and height in pixels
+        seed (int): Random seed, so runs are reproducible
+
+    Returns:
+        np.ndarray: uint8 array of shape (size, size, 3)
+    """
+    # Larger images are rendered at 1024 px and upscaled, which keeps
+    # generation fast and its memory use flat at 4096 px
+    if size > 1024:
+        import cv2
+
+        base = make_synthetic_fundus(1024, seed)
+        return cv2.resize(base, (size, size), interpolation=cv2.INTER_LINEAR)
+
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    cx, cy = 0.5, 0.5
+    r = np.hypot(xx - cx, yy - cy)
+
+    # Retina: orange-red disc fading towards its edge
+    falloff = np.clip(1.0 - (r / 0.46) ** 2, 0.0, 1.0)
+    image = np.zeros((size, size, 3), dtype=np.float32)
+    image[..., 0] = 200 * falloff + 20
+    image[..., 1] = 90 * falloff + 10
+    image[..., 2] = 40 * falloff + 5
+
+    # Optic disc: bright spot off-centre
+    dx, dy = cx + rng.uniform(0.12, 0.2), cy + rng.uniform(-0.05, 0.05)
+    disc = np.exp(-(((xx - dx) ** 2 + (yy - dy) ** 2) / (2 * 0.035 ** 2)))
+    image += disc[..., None] * np.array([60, 160, 170], dtype=np.float32)
+
+    # Vessels: dark sinusoidal arcs leaving the optic disc
+    for _ in range(6):
+        angle = rng.uniform(0, 2 * np.pi)
+        curve = rng.uniform(-0.6, 0.6)
+        theta = np.arctan2(yy - dy, xx - dx)
+        dist = np.hypot(xx - dx, yy - dy)
+        along = np.abs(np.angle(np.exp(1j * (theta - angle - curve * dist))))
+        vessel = np.exp(-((along * dist) ** 2) / (2 * 0.004 ** 2)) * (dist > 0.04)
+        image *= 1.0 - 0.45 * vessel[..., None]
+
+    image += rng.normal(0, 4, image.shape).astype(np.float32)
+    image[r > 0.48] *= 0.05
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def encode_jpeg(array, quality=90):
+    """Encode an RGB array as JPEG bytes, as a browser upload would arrive."""
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_multi_blob_frame(size, seed=0, blobs=6):
+    """
+    Generate a frame with several bright regions of different shapes.
+
+    Solid discs, thin rings and speckle patches are mixed so that a
+    region's pixel count and its contour area rank regions differently,
+    which is what optic cup selection has to get right.
+
+    Args:
+        size (int): Width and height in pixels
+        seed (int): Random seed
+        blobs (int): Number of bright regions
+
+    Returns:
+        np.ndarray: uint8 RGB array of shape (size, size, 3)
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    image = np.full((size, size, 3), 60, dtype=np.uint8)
+    margin = max(1, size // 10)
+    for _ in range(blobs):
+        x, y = (int(v) for v in rng.integers(margin, size - margin, 2))
+        radius = int(rng.integers(size // 30, size // 8))
+        kind = rng.random()
+        if kind < 0.3:
+            cv2.circle(image, (x, y), radius * 2, (255, 255, 255), 3)
+        elif kind < 0.6:
+            patch = rng.random((2 * radius, 2 * radius)) < 0.02
+            region = image[y:y + 2 * radius, x:x + 2 * radius]
+            region[patch[:region.shape[0], :region.shape[1]]] = 255
+        else:
+            cv2.circle(image, (x, y), radius, (255, 255, 255), -1)
+    return image
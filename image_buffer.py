@@ -0,0 +1,86 @@
+import numpy as np
+from PIL import Image
+
+
+class ImageBuffer:
+    """
+    A single contiguous RGB uint8 buffer shared by every stage of an analysis.
+
+    The verifier, preprocessing and ROI detection all read from read-only
+    views of the same array instead of each converting the upload again.
+    A stage that needs to draw on or otherwise modify the pixels asks for
+    ``writable_copy()``, so a full-frame copy is only made when something
+    actually writes.
+    """
+
+    def __init__(self, array):
+        """
+        Args:
+            array (np.ndarray): uint8 array of shape (H, W, 3) in RGB order.
+                It is shared, not copied, when already C-contiguous, so
+                callers must not keep writing to it.
+        """
+        array = np.ascontiguousarray(array, dtype=np.uint8)
+        if array.ndim != 3 or array.shape[2] != 3:
+            raise ValueError(f"Expected an RGB array of shape (H, W, 3), got {array.shape}")
+        # Lock a view rather than the caller's array itself
+        array = array.view()
+        array.flags.writeable = False
+        self._array = array
+
+    @classmethod
+    def from_pil(cls, image):
+        """Create a buffer from a PIL Image, converting to RGB only if needed."""
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        # np.array always copies out of PIL's internal storage; this is the
+        # one full-frame copy the buffer owns
+        return cls(np.array(image))
+
+    @classmethod
+    def from_any(cls, image):
+        """Wrap an ImageBuffer, PIL Image or RGB array without copying where possible."""
+        if isinstance(image, cls):
+            return image
+        if isinstance(image, Image.Image):
+            return cls.from_pil(image)
+        return cls(np.asarray(image))
+
+    @property
+    def array(self):
+        """Read-only (H, W, 3) RGB view of the buffer."""
+        return self._array.view()
+
+    @property
+    def size(self):
+        """(width, height), matching ``PIL.Image.size``."""
+        return self._array.shape[1], self._array.shape[0]
+
+    @property
+    def shape(self):
+        return self._array.shape
+
+    @property
+    def nbytes(self):
+        return self._array.nbytes
+
+    def writable_copy(self):
+        """Return a private, writable copy for stages that modify pixels."""
+        return self._array.copy()
+
+    def to_pil(self):
+        """Return a PIL Image of the buffer (copies; PIL keeps its own storage)."""
+        return Image.fromarray(self._array)
+
+
+def as_rgb_array(image):
+    """
+    Get a read-only RGB uint8 view of an image.
+
+    Args:
+        image: An ImageBuffer, PIL Image or (H, W, 3) RGB array
+
+    Returns:
+        np.ndarray: (H, W, 3) RGB array that must not be written to
+    """
+    return ImageBuffer.from_any(image).array
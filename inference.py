@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+
+class BatchScheduler:
+    """
+    Collect single-image inference requests from many sessions into batches.
+
+    Every Streamlit session runs in its own script thread, so without
+    batching each upload pays the full per-call overhead of the model. The
+    scheduler owns one worker thread that pulls pending requests off a queue,
+    waits at most ``max_wait_ms`` for more to arrive, and runs them through the
+    model as a single batch. Batches are zero-padded up to the next power of
+    two (capped at ``max_batch_size``) so the model only ever sees a handful of
+    fixed input shapes and TensorFlow does not retrace its graph.
+    """
+
+    def __init__(self, predict_fn, input_shape, max_batch_size=8, max_wait_ms=5.0, dtype=np.float32):
+        """
+        Args:
+            predict_fn (callable): Runs the model on an (N, *input_shape) array
+            input_shape (tuple): Shape of a single sample, e.g. (224, 224, 3)
+            max_batch_size (int): Largest batch sent to the model in one call
+            max_wait_ms (float): How long to wait for more requests once the
+                first request of a batch has arrived
+            dtype: Dtype of the batch array handed to ``predict_fn``
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.predict_fn = predict_fn
+        self.input_shape = tuple(input_shape)
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.dtype = dtype
+
+        # Fixed batch shapes the model will be called with: 1, 2, 4, ... max_batch_size
+        self.bucket_sizes = []
+        size = 1
+        while size < self.max_batch_size:
+            self.bucket_sizes.append(size)
+            size *= 2
+        self.bucket_sizes.append(self.max_batch_size)
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, sample):
+        """
+        Queue a single sample for inference.
+
+        Args:
+            sample (np.ndarray): Array of shape ``input_shape``
+
+        Returns:
+            concurrent.futures.Future: Resolves to the model output for this sample
+        """
+        sample = np.asarray(sample, dtype=self.dtype)
+        if sample.shape != self.input_shape:
+            raise ValueError(f"Expected sample of shape {self.input_shape}, got {sample.shape}")
+
+        future = Future()
+        self._queue.put((sample, future))
+        return future
+
+    def predict(self, sample, timeout=None):
+        """
+        Run inference on a single sample and block until its result is ready.
+
+        Raises:
+            concurrent.futures.TimeoutError: If no result arrives within
+                ``timeout`` seconds; the request is cancelled if it has not
+                started running yet
+        """
+        future = self.submit(sample)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        """Stop the worker thread once all queued requests have been served."""
+        self._queue.put(None)
+        self._worker.join()
+
+    def _bucket_size(self, n):
+        for size in self.bucket_sizes:
+            if size >= n:
+                return size
+        return self.max_batch_size
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back so the worker exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            self._run_batch(self._collect_batch(first))
+
+    def _run_batch(self, batch):
+        # Skip requests whose callers have already given up
+        batch = [(sample, future) for sample, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        # Any failure, including a model that returns too few rows, must reach
+        # every waiting caller; otherwise they block forever and the worker dies
+        try:
+            inputs = np.zeros((self._bucket_size(len(batch)),) + self.input_shape, dtype=self.dtype)
+            for i, (sample, _) in enumerate(batch):
+                inputs[i] = sample
+
+            outputs = np.asarray(self.predict_fn(inputs))
+            if len(outputs) < len(batch):
+                raise ValueError(f"Model returned {len(outputs)} outputs for a batch of {len(batch)}")
+
+            results = [outputs[i] for i in range(len(batch))]
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,272 @@
+"""
+Local inference daemon shared by every Streamlit worker on a machine.
+
+The daemon loads TensorFlow and the models once, with fixed intra- and
+inter-op thread counts, and serves requests over a Unix socket. Verifier
+requests from all connected workers go through one BatchScheduler, so they
+are batched together; condition-model analyses run on a bounded number of
+slots. The UI processes become thin clients and never import TensorFlow.
+
+Set KHAIRE_INFERENCE_SOCKET in the app's environment to use a running
+daemon; without it everything runs in-process as before.
+
+Usage:
+    python inference_daemon.py --socket /tmp/khaire-inference.sock --intra-op-threads 4
+"""
+import argparse
+import os
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+
+from image_buffer import ImageBuffer
+
+# Requests travel as pickles, so the socket is created owner-only and an
+# optional shared key (KHAIRE_INFERENCE_AUTHKEY) authenticates clients
+INFERENCE_SOCKET = os.environ.get("KHAIRE_INFERENCE_SOCKET")
+INFERENCE_AUTHKEY = os.environ.get("KHAIRE_INFERENCE_AUTHKEY")
+INFERENCE_TIMEOUT = float(os.environ.get("KHAIRE_INFERENCE_TIMEOUT", "60"))
+
+
+class InferenceError(Exception):
+    """Raised on the client when the daemon fails a request."""
+
+
+def configure_tensorflow_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Fix TensorFlow's thread pools. Must run before the first model loads.
+
+    Args:
+        intra_op_threads (int): Threads used inside one op; None keeps TF's default
+        inter_op_threads (int): Ops run in parallel; None keeps TF's default
+    """
+    import tensorflow as tf
+
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+class InferenceDaemon:
+    """
+    Serve verifier and condition-model requests to local clients.
+
+    Each client connection is handled on its own thread. Requests are dicts
+    with an "op" key; replies are {"ok": True, "result": ...} or
+    {"ok": False, "error": message}.
+    """
+
+    def __init__(self, address, authkey=None, max_batch_size=8, max_wait_ms=5.0, max_analyses=None):
+        import verifier
+
+        self.address = address
+        self.authkey = authkey
+        self.scheduler = verifier.create_verifier_scheduler(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self._analysis_slots = threading.BoundedSemaphore(max_analyses or os.cpu_count() or 1)
+        self._listener = None
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        # Owner-only from the moment the socket file is created
+        old_umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        finally:
+            os.umask(old_umask)
+
+        print(f"Inference daemon listening on {self.address}", flush=True)
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except OSError as e:
+                    if self._listener is None:
+                        break
+                    print(f"Error accepting connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+        self.scheduler.close()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = {"ok": True, "result": self._handle(request)}
+                except Exception as e:
+                    print(f"Error handling {request.get('op')} request: {e}")
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def _handle(self, request):
+        op = request.get("op")
+        if op == "verify":
+            # Give up with the client so a stuck batch cannot pin this thread
+            return self.scheduler.predict(request["input"], timeout=request.get("timeout") or INFERENCE_TIMEOUT)
+        if op == "predict":
+            import model
+
+            with self._analysis_slots:
+                image = ImageBuffer(request["image"])
+                return model.predict_health_conditions_local(image, request.get("image_quality"))
+        if op == "model_versions":
+            import model
+
+            return model.get_model_versions()
+        if op == "ping":
+            return "pong"
+        raise ValueError(f"Unknown op: {op}")
+
+
+class RemoteVerifier:
+    """Verifier with the ``predict(sample)`` interface of a BatchScheduler, served by the daemon."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def predict(self, sample, timeout=None):
+        return self.client.request({"op": "verify", "input": sample, "timeout": timeout}, timeout=timeout)
+
+
+class InferenceClient:
+    """
+    Client for an InferenceDaemon.
+
+    Keeps one connection per thread, so Streamlit script threads and job
+    workers can call it concurrently, and reconnects once if the daemon
+    restarted since the last call.
+    """
+
+    def __init__(self, address, authkey=None, timeout=INFERENCE_TIMEOUT):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def request(self, request, timeout=None):
+        """
+        Send one request and wait for its reply.
+
+        Raises:
+            InferenceError: If the daemon reports an error or does not reply in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(request)
+                if not conn.poll(timeout):
+                    # The reply would arrive out of order on the next request
+                    self._drop_connection()
+                    raise InferenceError(f"Inference daemon did not reply within {timeout:g}s")
+                reply = conn.recv()
+                break
+            except (EOFError, OSError) as e:
+                self._drop_connection()
+                if attempt:
+                    raise InferenceError(f"Inference daemon unavailable at {self.address}: {e}") from e
+        if not reply["ok"]:
+            raise InferenceError(reply["error"])
+        return reply["result"]
+
+    def verifier(self):
+        return RemoteVerifier(self)
+
+    def predict_health_conditions(self, image, image_quality=None):
+        # Sent as a plain RGB array, which pickles without PIL's overhead
+        array = ImageBuffer.from_any(image).array
+        return self.request({"op": "predict", "image": array, "image_quality": image_quality})
+
+    def ping(self):
+        return self.request({"op": "ping"}, timeout=5)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process's InferenceClient, or None when no daemon is configured."""
+    global _client
+    if not INFERENCE_SOCKET:
+        return None
+    with _client_lock:
+        if _client is None:
+            authkey = INFERENCE_AUTHKEY.encode() if INFERENCE_AUTHKEY else None
+            _client = InferenceClient(INFERENCE_SOCKET, authkey)
+        return _client
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the fundus models to local Streamlit workers.")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET or "/tmp/khaire-inference.sock", help="Unix socket path")
+    parser.add_argument("--intra-op-threads", type=int, default=int(os.environ.get("KHAIRE_TF_INTRA_OP_THREADS", "0")),
+                        help="TensorFlow intra-op threads (0 keeps the default)")
+    parser.add_argument("--inter-op-threads", type=int, default=int(os.environ.get("KHAIRE_TF_INTER_OP_THREADS", "0")),
+                        help="TensorFlow inter-op threads (0 keeps the default)")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Largest verifier batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a verifier batch waits to fill")
+    parser.add_argument("--max-analyses", type=int, help="Analyses run at once (default: CPU count)")
+    parser.add_argument("--no-warmup", action="store_true", help="Load models on first request instead of at startup")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.intra_op_threads or args.inter_op_threads:
+        try:
+            configure_tensorflow_threads(args.intra_op_threads, args.inter_op_threads)
+        except ImportError as e:
+            print(f"Error configuring TensorFlow threads: {e}")
+
+    if not args.no_warmup:
+        from model_registry import registry
+
+        registry.warmup()
+
+    authkey = INFERENCE_AUTHKEY.encode() if INFERENCE_AUTHKEY else None
+    daemon = InferenceDaemon(
+        args.socket,
+        authkey=authkey,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_analyses=args.max_analyses,
+    )
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+_current = threading.local()
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def current_job():
+    """
+    Return the Job running on this worker thread, or None.
+
+    Long-running job functions can poll ``current_job().cancelled`` between
+    steps to stop early once the user has moved on.
+    """
+    return getattr(_current, "job", None)
+
+
+class Job:
+    """Handle for a unit of work submitted to a JobQueue."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_id, label=None):
+        self.id = job_id
+        self.label = label
+        self.status = Job.PENDING
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in (Job.DONE, Job.FAILED, Job.CANCELLED)
+
+    @property
+    def elapsed(self):
+        """Seconds since submission, or total run time once finished."""
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.submitted_at
+
+    def cancel(self):
+        """
+        Request cancellation.
+
+        A job still waiting in the queue never starts. A running job keeps
+        going until it checks ``current_job().cancelled``, and its result is
+        discarded either way.
+        """
+        self._cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(Job.CANCELLED)
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns True if it did within ``timeout``."""
+        if self._future is None:
+            return self.finished
+        try:
+            self._future.result(timeout=timeout)
+        except CancelledError:
+            pass
+        except Exception:
+            # A timeout or the job's own error; status reports which
+            pass
+        return self.finished
+
+    def _finish(self, status, result=None, error=None):
+        if self.finished:
+            return
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self.status = status
+
+
+class JobQueue:
+    """
+    Bounded worker pool for work that should not block a Streamlit script thread.
+
+    Acts as the admission control for the work it runs: at most
+    ``max_workers`` jobs run at once, so each keeps a predictable share of
+    the CPU, and at most ``max_pending`` more wait in first-in-first-out
+    order. Further submissions fail fast with QueueFullError instead of
+    making everyone slower. Waiting jobs can report their place in the
+    queue and an estimated wait, based on a moving average of recent run
+    times.
+    """
+
+    def __init__(self, max_workers=4, max_pending=32, thread_name_prefix="analysis-job", smoothing=0.2):
+        """
+        Args:
+            max_workers (int): Jobs run at once
+            max_pending (int): Jobs allowed to wait for a worker
+            thread_name_prefix (str): Name of the worker threads
+            smoothing (float): Weight of the newest run time in the average
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.smoothing = smoothing
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._ids = itertools.count(1)
+        self._active = 0
+        self._pending = OrderedDict()
+        self._mean_run_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        """Number of jobs queued or running."""
+        return self._active
+
+    @property
+    def pending(self):
+        """Number of jobs waiting for a worker."""
+        return len(self._pending)
+
+    @property
+    def mean_run_seconds(self):
+        """Moving average of how long a job runs, or None before the first finishes."""
+        return self._mean_run_seconds
+
+    def position(self, job):
+        """1-based place of a waiting job in the queue; 0 once it has started or finished."""
+        with self._lock:
+            for position, job_id in enumerate(self._pending, start=1):
+                if job_id == job.id:
+                    return position
+        return 0
+
+    def estimated_wait(self, job=None):
+        """
+        Estimate the seconds until a job starts.
+
+        Jobs leave the queue ``max_workers`` at a time, each batch taking
+        about one average run, so the estimate is the number of batches
+        ahead times the average run time.
+
+        Args:
+            job (Job): A waiting job; None estimates for a job submitted now
+
+        Returns:
+            float: Seconds, 0 for a job that has started, or None until a
+                run time has been measured
+        """
+        position = self.pending + 1 if job is None else self.position(job)
+        if position == 0:
+            return 0.0
+        if job is None and self._active < self.max_workers:
+            return 0.0
+        if self._mean_run_seconds is None:
+            return None
+        return math.ceil(position / self.max_workers) * self._mean_run_seconds
+
+    def submit(self, fn, *args, label=None, **kwargs):
+        """
+        Queue ``fn(*args, **kwargs)`` to run on a worker thread.
+
+        Args:
+            fn (callable): Work to run
+            label (str): Optional description shown while the job is pending
+
+        Returns:
+            Job: Handle for polling status, fetching the result or cancelling
+        """
+        with self._lock:
+            if self._active >= self.max_workers + self.max_pending:
+                raise QueueFullError("Too many jobs are queued. Please try again shortly.")
+            self._active += 1
+            job = Job(next(self._ids), label=label)
+            self._pending[job.id] = job
+
+        try:
+            job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        except Exception:
+            self._release(job)
+            raise
+        job._future.add_done_callback(lambda _: self._release(job))
+        return job
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _release(self, job):
+        with self._lock:
+            self._active -= 1
+            self._pending.pop(job.id, None)
+
+    def _record_run_time(self, seconds):
+        with self._lock:
+            if self._mean_run_seconds is None:
+                self._mean_run_seconds = seconds
+            else:
+                self._mean_run_seconds += self.smoothing * (seconds - self._mean_run_seconds)
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            self._pending.pop(job.id, None)
+        if job.cancelled:
+            job._finish(Job.CANCELLED)
+            return None
+
+        job.status = Job.RUNNING
+        job.started_at = time.time()
+        _current.job = job
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            job._finish(Job.FAILED, error=e)
+            raise
+        finally:
+            _current.job = None
+            self._record_run_time(time.time() - job.started_at)
+
+        job._finish(Job.CANCELLED if job.cancelled else Job.DONE, result=result)
+        return result
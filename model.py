@@ -1,146 +1,291 @@
 import numpy as np
-from Pillow import Image
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
 import io
 import time
 import random
 import os
-from roi_detector import ROIDetector
-import 
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import tracing
+from pyramid import ImagePyramid, InputSpec
 
-def predict_health_conditions(image):
+# Static metadata lives in model_info so importing it never pulls in the ML stack
+from model_info import get_model_versions, get_condition_info
+
+# TensorFlow and OpenCV (via roi_detector) are imported inside the functions
+# that need them, so they load on first inference rather than at import time
+
+# Condition models run concurrently on a pool shared by every analysis in the process
+CONDITION_WORKERS = int(os.environ.get("KHAIRE_CONDITION_WORKERS", "16"))
+CONDITION_MODEL_TIMEOUT = float(os.environ.get("KHAIRE_CONDITION_MODEL_TIMEOUT", "10"))
+# ROI detection on very large images can take longer than a model call
+GLAUCOMA_TIMEOUT = float(os.environ.get("KHAIRE_GLAUCOMA_TIMEOUT", "30"))
+
+# Latency of each placeholder model call
+SIMULATED_MODEL_LATENCY = 1.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CONDITION_WORKERS, thread_name_prefix="condition-model")
+        return _executor
+
+
+# Placeholder condition models. Each takes the tensor described by its
+# InputSpec below; in production these would be the outputs of ML models
+
+def _predict_alzheimer(tensor):
+    time.sleep(SIMULATED_MODEL_LATENCY)
+    return {
+        "risk_level": "Low to Moderate",
+        "risk_score": 32,
+        "biomarkers": ["Retinal vessel tortuosity", "RNFL thickness"]
+    }
+
+def _predict_neurological(tensor):
+    time.sleep(SIMULATED_MODEL_LATENCY)
+    return {
+        "score": 78,
+        "status": "Good",
+        "findings": ["Normal vascular pattern", "No signs of neural atrophy"]
+    }
+
+def _predict_diabetes(tensor):
+    time.sleep(SIMULATED_MODEL_LATENCY)
+    return {
+        "risk_level": "Moderate",
+        "confidence": 65.7,
+        "indicators": ["Mild vascular changes", "Early microaneurysms"]
+    }
+
+def _predict_blood_pressure(tensor):
+    time.sleep(SIMULATED_MODEL_LATENCY)
+    return {
+        "status": "Slightly Elevated",
+        "systolic_estimate": "130-140",
+        "diastolic_estimate": "85-90",
+        "confidence": 72.5
+    }
+
+def _predict_diabetic_retinopathy(tensor):
+    time.sleep(SIMULATED_MODEL_LATENCY)
+    return {
+        "stage": "Minimal/None",
+        "confidence": 88.3,
+        "details": "No significant retinopathy signs detected"
+    }
+
+def _predict_amd(tensor):
+    time.sleep(SIMULATED_MODEL_LATENCY)
+    return {
+        "status": "Early signs",
+        "confidence": 53.2,
+        "details": "Possible early drusen formation"
+    }
+
+def _predict_demographics(tensor):
+    time.sleep(SIMULATED_MODEL_LATENCY)
+    return {
+        "age": 52,
+        "age_range": "45-60",
+        "gender": "Female",
+        "gender_confidence": 78.5,
+        "ethnicity": "South Asian",
+        "ethnicity_confidence": 82.1
+    }
+
+def _failed_roi_results(status):
+    return {
+        "detection_status": status,
+        "glaucoma_risk": "Unknown",
+        "confidence": 0,
+        "cup_to_disc_ratio": None,
+        "bbox": None,
+        "processed_image": None
+    }
+
+def _predict_glaucoma(image):
+    # Process the image with the glaucoma detector
+    tracing.set_attributes(image_size=list(image.size))
+    try:
+        from roi_detector import ROIDetector
+        
+        roi_detector = ROIDetector()
+        if roi_detector.load_image(image):
+            roi_results = roi_detector.process_image()
+            tracing.set_attributes(detection_status=roi_results["detection_status"])
+        else:
+            tracing.record_error(ValueError("Failed to load image"))
+            roi_results = _failed_roi_results("Failed to process image")
+    except Exception as e:
+        print(f"Error in glaucoma detection: {e}")
+        tracing.record_error(e)
+        roi_results = _failed_roi_results("Error in processing")
+    
+    ratio = roi_results["cup_to_disc_ratio"]
+    return {
+        "status": roi_results["glaucoma_risk"],
+        "confidence": roi_results["confidence"],
+        "cup_to_disc_ratio": round(ratio, 2) if ratio is not None else None,
+        "detection_status": roi_results["detection_status"],
+        "processed_image": roi_results["processed_image"]
+    }
+
+# Inputs the condition models expect. Models that share a spec share one
+# tensor; update these to match each real model's training preprocessing
+RETINA_224 = InputSpec((224, 224), np.float32, "unit")
+RETINA_299 = InputSpec((299, 299), np.float32, "symmetric")
+RETINA_512 = InputSpec((512, 512), np.float32, "unit")
+IMAGENET_224 = InputSpec((224, 224), np.float32, "imagenet")
+
+# Results key -> (name for logs and trace spans, matching get_model_versions
+# for versioned models; predict function; InputSpec, or None to pass the
+# full-resolution ImageBuffer; timeout in seconds).
+# Listed in the order the results dict has always had.
+CONDITION_MODELS = {
+    "alzheimer_risk": ("alzheimer_model", _predict_alzheimer, RETINA_224, CONDITION_MODEL_TIMEOUT),
+    "neurological_health": ("neurological_model", _predict_neurological, RETINA_224, CONDITION_MODEL_TIMEOUT),
+    "diabetes": ("diabetes_model", _predict_diabetes, RETINA_299, CONDITION_MODEL_TIMEOUT),
+    "blood_pressure": ("bp_model", _predict_blood_pressure, IMAGENET_224, CONDITION_MODEL_TIMEOUT),
+    "diabetic_retinopathy": ("dr_model", _predict_diabetic_retinopathy, RETINA_512, CONDITION_MODEL_TIMEOUT),
+    "amd": ("amd_model", _predict_amd, RETINA_299, CONDITION_MODEL_TIMEOUT),
+    "glaucoma": ("roi_detection", _predict_glaucoma, None, GLAUCOMA_TIMEOUT),
+    "demographics": ("demographics_model", _predict_demographics, IMAGENET_224, CONDITION_MODEL_TIMEOUT),
+}
+
+def _run_model(name, predict, model_input, started_at, key):
+    # Timeouts count from here, not from submission, so time spent queued
+    # behind other analyses is not charged to this model
+    started_at[key] = time.monotonic()
+    with tracing.span(name):
+        return predict(model_input)
+
+def _wait_for_model(future, timeout, submitted, started_at, key):
+    # Waits up to ``timeout`` for the call to start and ``timeout`` more for
+    # it to finish. Raises FutureTimeoutError with the reason otherwise.
+    deadline = submitted + timeout
+    while True:
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            if future.cancel():
+                # Still queued; dropping it frees the worker for the next analysis
+                raise FutureTimeoutError(f"Not started within {timeout:g}s, the model pool is busy")
+            run_deadline = started_at.get(key, time.monotonic()) + timeout
+            if run_deadline <= deadline:
+                raise FutureTimeoutError(f"Timed out after {timeout:g}s")
+            deadline = run_deadline
+
+def run_condition_models(image, models=None):
     """
-    Process the retinal image and predict various health conditions.
-    In a production environment, this would call actual ML model APIs.
+    Run the condition models concurrently on one image.
+    
+    Model inputs come from one ImagePyramid of the image, so each resolution
+    and each normalization is computed once and shared read-only by every
+    model that declares it. Each model has its own timeout, counted from when
+    its call starts running; a call still queued after that long is
+    cancelled. A model that fails or times out is left out of the results and
+    its error recorded instead, so the other results are still returned. A
+    call that times out while running keeps its worker thread until it
+    returns, but nothing waits for it.
     
     Args:
-        image (PIL.Image): Processed retinal fundus image
+        image: Processed retinal fundus image as a PIL Image or ImageBuffer
+        models (dict): Subset of CONDITION_MODELS to run, defaults to all
         
     Returns:
-        dict: Predicted health conditions and demographics
+        tuple: (results keyed like CONDITION_MODELS, {results key: error message})
     """
-    # Note: In a real implementation, this would connect to actual ML models
-    # This function is structured to be easily replaced with real ML model API calls
+    models = CONDITION_MODELS if models is None else models
+    pyramid = ImagePyramid(image)
     
-    # Simulate API processing time
-    time.sleep(1)
+    with tracing.span("model_inputs"):
+        inputs = {key: pyramid.input_for(spec) for key, (_, _, spec, _) in models.items() if spec is not None}
+        tracing.set_attributes(tensors=len({spec.key for _, _, spec, _ in models.values() if spec is not None}))
     
-    # Convert image to format suitable for ML model (example)
-    img_array = np.array(image)
+    executor = _get_executor()
+    futures = {}
+    started_at = {}
+    submitted = time.monotonic()
+    for key, (name, predict, spec, _) in models.items():
+        # Copy the context so model spans land in the caller's trace
+        context = contextvars.copy_context()
+        # Models without a spec get the full-resolution buffer the pyramid
+        # already decoded, not the caller's image to convert again
+        model_input = pyramid.base if spec is None else inputs[key]
+        futures[key] = executor.submit(context.run, _run_model, name, predict, model_input, started_at, key)
     
-    # Process the image with the glaucoma detector
-    try:
-        roi_detector = ROIDetector()
-        if roi_detector.load_image(image):
-            roi_detector = roi_detector.process_image()
-        else:
-            roi_results = {
-                "detection_status": "Failed to process image",
-                "glaucoma_risk": "Unknown",
-                "confidence": 0,
-                "cup_to_disc_ratio": None,
-                "bbox": None,
-                "processed_image": None
-            }
-    except Exception as e:
-        print(f"Error in glaucoma detection: {e}")
-        roi_results = {
-            "detection_status": "Error in processing",
-            "glaucoma_risk": "Unknown",
-            "confidence": 0,
-            "cup_to_disc_ratio": None,
-            "bbox": None,
-            "processed_image": None
-        }
-    
-    # In production, these would be the outputs of ML models
-    # Example structure for results that would come from models
-    results = {
-        "alzheimer_risk": {
-            "risk_level": "Low to Moderate",
-            "risk_score": 32,
-            "biomarkers": ["Retinal vessel tortuosity", "RNFL thickness"]
-        },
-        
-        "neurological_health": {
-            "score": 78,
-            "status": "Good",
-            "findings": ["Normal vascular pattern", "No signs of neural atrophy"]
-        },
-        
-        "diabetes": {
-            "risk_level": "Moderate",
-            "confidence": 65.7,
-            "indicators": ["Mild vascular changes", "Early microaneurysms"]
-        },
-        
-        "blood_pressure": {
-            "status": "Slightly Elevated",
-            "systolic_estimate": "130-140",
-            "diastolic_estimate": "85-90",
-            "confidence": 72.5
-        },
-        
-        "diabetic_retinopathy": {
-            "stage": "Minimal/None",
-            "confidence": 88.3,
-            "details": "No significant retinopathy signs detected"
-        },
-        
-        "amd": {
-            "status": "Early signs",
-            "confidence": 53.2,
-            "details": "Possible early drusen formation"
-        },
-        
-        "glaucoma": {
-            "status": roi_results["glaucoma_risk"] if isinstance(roi_results, dict) and "glaucoma_risk" in roi_results else "Unknown",
-            "confidence": roi_results["confidence"] if isinstance(roi_results, dict) and "confidence" in roi_results else 0,
-            "cup_to_disc_ratio": round(roi_results["cup_to_disc_ratio"], 2) if isinstance(roi_results, dict) and "cup_to_disc_ratio" in roi_results and roi_results["cup_to_disc_ratio"] is not None else None,
-            "detection_status": roi_results["detection_status"] if isinstance(roi_results, dict) and "detection_status" in roi_results else "Failed to detect",
-            "processed_image": roi_results["processed_image"] if isinstance(roi_results, dict) and "processed_image" in roi_results else None
-        },
-        
-        "demographics": {
-            "age": 52,
-            "age_range": "45-60",
-            "gender": "Female",
-            "gender_confidence": 78.5,
-            "ethnicity": "South Asian",
-            "ethnicity_confidence": 82.1
-        },
-        
-        "other_conditions": [
-            "Mild hypertensive retinopathy"
-        ],
+    results = {}
+    errors = {}
+    for key, future in futures.items():
+        try:
+            results[key] = _wait_for_model(future, models[key][3], submitted, started_at, key)
+        except FutureTimeoutError as e:
+            errors[key] = str(e)
+        except Exception as e:
+            print(f"Error in {models[key][0]}: {e}")
+            errors[key] = f"{type(e).__name__}: {e}"
+    return results, errors
+
+def predict_health_conditions(image, image_quality=None):
+    """
+    Process the retinal image and predict various health conditions.
+    In a production environment, this would call actual ML model APIs.
+    
+    Runs on the inference daemon when KHAIRE_INFERENCE_SOCKET is set, and in
+    this process otherwise.
+    
+    Args:
+        image: Processed retinal fundus image as a PIL Image or ImageBuffer
+        image_quality (dict): Result of ``quality.assess_image_quality`` when
+            the caller already gated the upload on it; measured here otherwise
         
-        "image_quality": {
-            "quality_score": 85,
-            "is_suitable": True,
-            "improvement_suggestions": []
-        }
-    }
+    Returns:
+        dict: Predicted health conditions and demographics. Conditions whose
+            model failed are missing, with the reason under "model_errors".
+    """
+    from inference_daemon import get_client
     
-    return results
+    client = get_client()
+    if client is not None:
+        with tracing.span("remote_predict"):
+            return client.predict_health_conditions(image, image_quality)
+    return predict_health_conditions_local(image, image_quality)
 
-def get_model_versions():
+def predict_health_conditions_local(image, image_quality=None):
     """
-    Return the versions of models being used for predictions.
-    In production, this would return actual model versions.
+    Run ``predict_health_conditions`` in this process.
     
-    Returns:
-        dict: Model names and versions
+    This is what the inference daemon runs for its clients.
     """
-    return {
-        "alzheimer_model": "v1.2.3",
-        "diabetes_model": "v2.0.1",
-        "dr_model": "v3.1.0",
-        "amd_model": "v1.5.2",
-        "demographics_model": "v2.2.1",
-        "neurological_model": "v1.1.0",
-        "bp_model": "v1.3.4"
-    }
+    # Note: In a real implementation, this would connect to actual ML models
+    # This function is structured to be easily replaced with real ML model API calls
+    
+    if image_quality is None:
+        with tracing.span("quality"):
+            from quality import assess_image_quality
+            image_quality = assess_image_quality(image)
+    
+    # Independent models run side by side, so this takes as long as the slowest
+    with tracing.span("condition_models"):
+        results, errors = run_condition_models(image)
+        if errors:
+            tracing.record_error(RuntimeError(f"{len(errors)} condition models failed"))
+            tracing.set_attributes(failed_models=sorted(errors))
+    
+    results["other_conditions"] = [
+        "Mild hypertensive retinopathy"
+    ]
+    results["image_quality"] = image_quality
+    if errors:
+        results["model_errors"] = errors
+    
+    return results
 
 def is_fundus_image(image):
     """
@@ -164,86 +309,10 @@ def is_fundus_image(image):
     if width < 200 or height < 200:
         return False
     
-    # Load the saved model
-    model = load_model("fundus_classifier.keras")
+    # Get the saved model; the registry loads and compiles it once per process
+    from model_registry import registry
     
-    # Compile the model after loading
-    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    model = registry.get("fundus_classifier")
     # if this is actually a fundus image
     
     return True
-
-def get_condition_info(condition_name):
-    """
-    Get detailed information about a specific health condition.
-    
-    Args:
-        condition_name (str): Name of the condition
-        
-    Returns:
-        dict: Information about the condition
-    """
-    conditions_info = {
-        "alzheimers": {
-            "name": "Alzheimer's Disease",
-            "description": "Alzheimer's disease is a progressive neurologic disorder that causes the brain to shrink (atrophy) and brain cells to die.",
-            "retinal_indicators": [
-                "Thinning of the Retinal Nerve Fiber Layer (RNFL)",
-                "Changes in retinal blood vessel diameter",
-                "Altered vascular tortuosity"
-            ],
-            "research_status": "Emerging research shows strong correlation between retinal changes and early Alzheimer's disease progression."
-        },
-        "diabetes": {
-            "name": "Diabetes Mellitus",
-            "description": "Diabetes is a chronic disease that occurs when the pancreas is no longer able to make insulin, or when the body cannot make good use of the insulin it produces.",
-            "retinal_indicators": [
-                "Microaneurysms (small red dots)",
-                "Hard exudates (yellow deposits)",
-                "Macular edema",
-                "Vascular changes"
-            ],
-            "research_status": "Well-established connection between retinal changes and diabetes. Retinal screening is standard practice for diabetic patients."
-        },
-        "hypertension": {
-            "name": "Hypertension (High Blood Pressure)",
-            "description": "Hypertension is a condition in which the force of the blood against the artery walls is too high.",
-            "retinal_indicators": [
-                "Arteriolar narrowing",
-                "A/V nicking (where arteries cross over veins)",
-                "Altered arteriole-to-venule ratio",
-                "Flame hemorrhages"
-            ],
-            "research_status": "Strong clinical evidence supporting the use of retinal imaging to assess hypertension severity and control."
-        },
-        "dr": {
-            "name": "Diabetic Retinopathy",
-            "description": "Diabetic retinopathy is a diabetes complication that affects the eyes. It's caused by damage to the blood vessels in the retina.",
-            "retinal_indicators": [
-                "Microaneurysms",
-                "Hemorrhages",
-                "Hard exudates",
-                "Cotton wool spots",
-                "Neovascularization"
-            ],
-            "research_status": "Standard diagnostic procedure with well-established grading systems and treatment protocols."
-        },
-        "amd": {
-            "name": "Age-related Macular Degeneration",
-            "description": "AMD is a condition affecting the macula, the central part of the retina responsible for sharp, central vision.",
-            "retinal_indicators": [
-                "Drusen (yellow deposits)",
-                "Pigmentary changes in the macula",
-                "Geographic atrophy",
-                "Choroidal neovascularization"
-            ],
-            "research_status": "Well-established diagnostic criteria with active research into early detection methods."
-        }
-    }
-    
-    return conditions_info.get(condition_name, {
-        "name": condition_name,
-        "description": "Information not available",
-        "retinal_indicators": [],
-        "research_status": "Information not available"
-    })
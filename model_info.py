@@ -0,0 +1,106 @@
+"""
+Static model and condition metadata.
+
+Kept free of TensorFlow, OpenCV and other heavy imports so pages that only
+show this information load instantly.
+"""
+from model_registry import registry
+
+
+def get_model_versions():
+    """
+    Return the versions of models being used for predictions.
+    
+    Models backed by files in the model registry report a version derived
+    from the file's SHA-256; the condition models are still placeholders.
+    
+    Returns:
+        dict: Model names and versions
+    """
+    versions = {
+        "alzheimer_model": "v1.2.3",
+        "diabetes_model": "v2.0.1",
+        "dr_model": "v3.1.0",
+        "amd_model": "v1.5.2",
+        "demographics_model": "v2.2.1",
+        "neurological_model": "v1.1.0",
+        "bp_model": "v1.3.4"
+    }
+    for name, info in registry.describe().items():
+        versions[f"{name}_model"] = info["version"]
+    return versions
+
+def get_condition_info(condition_name):
+    """
+    Get detailed information about a specific health condition.
+    
+    Args:
+        condition_name (str): Name of the condition
+        
+    Returns:
+        dict: Information about the condition
+    """
+    conditions_info = {
+        "alzheimers": {
+            "name": "Alzheimer's Disease",
+            "description": "Alzheimer's disease is a progressive neurologic disorder that causes the brain to shrink (atrophy) and brain cells to die.",
+            "retinal_indicators": [
+                "Thinning of the Retinal Nerve Fiber Layer (RNFL)",
+                "Changes in retinal blood vessel diameter",
+                "Altered vascular tortuosity"
+            ],
+            "research_status": "Emerging research shows strong correlation between retinal changes and early Alzheimer's disease progression."
+        },
+        "diabetes": {
+            "name": "Diabetes Mellitus",
+            "description": "Diabetes is a chronic disease that occurs when the pancreas is no longer able to make insulin, or when the body cannot make good use of the insulin it produces.",
+            "retinal_indicators": [
+                "Microaneurysms (small red dots)",
+                "Hard exudates (yellow deposits)",
+                "Macular edema",
+                "Vascular changes"
+            ],
+            "research_status": "Well-established connection between retinal changes and diabetes. Retinal screening is standard practice for diabetic patients."
+        },
+        "hypertension": {
+            "name": "Hypertension (High Blood Pressure)",
+            "description": "Hypertension is a condition in which the force of the blood against the artery walls is too high.",
+            "retinal_indicators": [
+                "Arteriolar narrowing",
+                "A/V nicking (where arteries cross over veins)",
+                "Altered arteriole-to-venule ratio",
+                "Flame hemorrhages"
+            ],
+            "research_status": "Strong clinical evidence supporting the use of retinal imaging to assess hypertension severity and control."
+        },
+        "dr": {
+            "name": "Diabetic Retinopathy",
+            "description": "Diabetic retinopathy is a diabetes complication that affects the eyes. It's caused by damage to the blood vessels in the retina.",
+            "retinal_indicators": [
+                "Microaneurysms",
+                "Hemorrhages",
+                "Hard exudates",
+                "Cotton wool spots",
+                "Neovascularization"
+            ],
+            "research_status": "Standard diagnostic procedure with well-established grading systems and treatment protocols."
+        },
+        "amd": {
+            "name": "Age-related Macular Degeneration",
+            "description": "AMD is a condition affecting the macula, the central part of the retina responsible for sharp, central vision.",
+            "retinal_indicators": [
+                "Drusen (yellow deposits)",
+                "Pigmentary changes in the macula",
+                "Geographic atrophy",
+                "Choroidal neovascularization"
+            ],
+            "research_status": "Well-established diagnostic criteria with active research into early detection methods."
+        }
+    }
+    
+    return conditions_info.get(condition_name, {
+        "name": condition_name,
+        "description": "Information not available",
+        "retinal_indicators": [],
+        "research_status": "Information not available"
+    })
@@ -0,0 +1,269 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def _load_keras_model(path, compile_model=False):
+    # Deferred so importing the registry never loads TensorFlow
+    from tensorflow.keras.models import load_model
+
+    model = load_model(path, compile=False)
+    if compile_model:
+        model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def _load_tflite_model(path):
+    from tflite_backend import TFLiteModel
+
+    threads = os.environ.get("KHAIRE_TFLITE_THREADS")
+    return TFLiteModel(path, num_threads=int(threads) if threads else None)
+
+
+# With KHAIRE_SHARED_WEIGHTS_DIR set, Keras models are served from weight
+# files in that directory that all worker processes on the host memory-map
+# read-only; each process keeps only its own interpreter and activations
+SHARED_WEIGHTS_DIR = os.environ.get("KHAIRE_SHARED_WEIGHTS_DIR")
+
+
+def _load_shared_model(path):
+    from tflite_backend import TFLiteModel, export_shared_weights
+
+    shared_path = export_shared_weights(path, SHARED_WEIGHTS_DIR, load_keras_model=_load_keras_model)
+    threads = os.environ.get("KHAIRE_TFLITE_THREADS")
+    return TFLiteModel(shared_path, num_threads=int(threads) if threads else None, default_delegates=False)
+
+
+class ModelEntry:
+    """A loaded model together with the identity of the file it came from."""
+
+    def __init__(self, model, path, sha256, mtime, loaded_at):
+        self.model = model
+        self.path = path
+        self.sha256 = sha256
+        self.mtime = mtime
+        self.loaded_at = loaded_at
+
+    @property
+    def version(self):
+        return f"sha256:{self.sha256[:12]}"
+
+
+class ModelRegistry:
+    """
+    Process-wide registry that loads each model once and keeps it.
+
+    Models are registered by name with the file they load from. The first
+    ``get`` loads the file, runs a warmup inference so graph tracing happens
+    before any user request, and caches the instance. ``reload`` swaps in a
+    new file without restarting the server, and ``get`` picks up changes to a
+    model file automatically every ``reload_check_interval`` seconds.
+    """
+
+    def __init__(self, reload_check_interval=30.0):
+        self.reload_check_interval = reload_check_interval
+        self._specs = {}
+        self._entries = {}
+        self._last_checked = {}
+        self._file_hashes = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, path, input_shape=None, loader=None, compile_model=False, pinned_sha256=None):
+        """
+        Register a model file under a name. Nothing is loaded until ``get``.
+
+        Args:
+            name (str): Registry key, e.g. "fundus_verifier"
+            path (str): Model file path
+            input_shape (tuple): Shape of one sample, used for warmup; None skips warmup
+            loader (callable): ``loader(path)`` returning a model; defaults to Keras
+            compile_model (bool): Compile Keras models after loading
+            pinned_sha256 (str): Refuse to load the file unless its hash matches
+        """
+        with self._lock:
+            self._specs[name] = {
+                "path": path,
+                "input_shape": tuple(input_shape) if input_shape is not None else None,
+                "loader": loader or (lambda p: _load_keras_model(p, compile_model)),
+                "pinned_sha256": pinned_sha256.lower() if pinned_sha256 else None,
+            }
+
+    def get(self, name):
+        """
+        Return the loaded model, loading (and warming up) on first use.
+
+        Args:
+            name (str): Registered model name
+
+        Returns:
+            The model instance
+        """
+        entry = self._entries.get(name)
+        if entry is not None:
+            self._maybe_reload(name, entry)
+            return self._entries[name].model
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._load(name)
+                self._entries[name] = entry
+                self._last_checked[name] = time.monotonic()
+            return entry.model
+
+    def reload(self, name, path=None):
+        """
+        Hot-swap a model, optionally from a new file.
+
+        The new model is loaded and warmed up before it replaces the old one,
+        so callers keep using the previous instance until the swap.
+
+        Args:
+            name (str): Registered model name
+            path (str): New model file; defaults to the registered path
+
+        Returns:
+            ModelEntry: The newly loaded entry
+        """
+        with self._lock:
+            if path is not None:
+                self._specs[name]["path"] = path
+            entry = self._load(name)
+            self._entries[name] = entry
+            self._last_checked[name] = time.monotonic()
+            return entry
+
+    def warmup(self, names=None):
+        """Load and warm up the given models (all registered models by default)."""
+        for name in names or list(self._specs):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Error warming up model {name}: {e}")
+
+    def is_loaded(self, name):
+        return name in self._entries
+
+    def version(self, name):
+        """
+        Version of one model, as in ``describe()``, without touching the others.
+
+        Cheap enough to call per request: a loaded model reports its entry's
+        version and an unloaded one its file's cached hash.
+        """
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry.version
+        sha256 = self._hash_file(self._specs[name]["path"])
+        return f"sha256:{sha256[:12]}" if sha256 else "missing"
+
+    def describe(self):
+        """
+        Report the file identity of every registered model.
+
+        Loaded models report the file they were loaded from; models not yet
+        loaded report the file currently on disk.
+
+        Returns:
+            dict: Model name -> {"path", "version", "sha256", "loaded"}
+        """
+        info = {}
+        for name, spec in list(self._specs.items()):
+            entry = self._entries.get(name)
+            if entry is not None:
+                path, sha256 = entry.path, entry.sha256
+            else:
+                path, sha256 = spec["path"], self._hash_file(spec["path"])
+            info[name] = {
+                "path": path,
+                "version": f"sha256:{sha256[:12]}" if sha256 else "missing",
+                "sha256": sha256,
+                "loaded": entry is not None,
+            }
+        return info
+
+    def _hash_file(self, path):
+        # Hashes are cached by (size, mtime) so describe() stays cheap
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat.st_size, stat.st_mtime)
+        sha256 = self._file_hashes.get(key)
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+            self._file_hashes[key] = sha256
+        return sha256
+
+    def _load(self, name):
+        spec = self._specs[name]
+        path = spec["path"]
+        sha256 = self._hash_file(path)
+        if sha256 is None:
+            raise FileNotFoundError(f"Model file not found: {path}")
+        if spec["pinned_sha256"] and sha256 != spec["pinned_sha256"]:
+            raise ValueError(f"Model {name} at {path} has sha256 {sha256}, expected {spec['pinned_sha256']}")
+
+        model = spec["loader"](path)
+        if spec["input_shape"] is not None:
+            # One throwaway inference so graph tracing is not paid by a user
+            model.predict_on_batch(np.zeros((1,) + spec["input_shape"], dtype=np.float32))
+
+        return ModelEntry(model, path, sha256, os.path.getmtime(path), time.time())
+
+    def _maybe_reload(self, name, entry):
+        if self.reload_check_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_checked.get(name, 0) < self.reload_check_interval:
+            return
+        self._last_checked[name] = now
+        try:
+            if os.path.getmtime(entry.path) == entry.mtime:
+                return
+            if self._hash_file(entry.path) == entry.sha256:
+                return
+            self.reload(name)
+            print(f"Reloaded model {name} from {entry.path}")
+        except Exception as e:
+            # Keep serving the model already in memory
+            print(f"Error reloading model {name}: {e}")
+
+
+# Process-wide registry of the models shipped with the app
+registry = ModelRegistry(
+    reload_check_interval=float(os.environ.get("KHAIRE_MODEL_RELOAD_INTERVAL", "30")),
+)
+
+
+# KHAIRE_VERIFIER_BACKEND=tflite serves a converted model from tflite_backend.py
+if os.environ.get("KHAIRE_VERIFIER_BACKEND", "keras") == "tflite":
+    registry.register(
+        "fundus_verifier",
+        os.environ.get("KHAIRE_VERIFIER_MODEL", "fundus_verifier.float16.tflite"),
+        input_shape=(224, 224, 3),
+        loader=_load_tflite_model,
+        pinned_sha256=os.environ.get("KHAIRE_VERIFIER_SHA256"),
+    )
+else:
+    registry.register(
+        "fundus_verifier",
+        os.environ.get("KHAIRE_VERIFIER_MODEL", "fundus_verifier.h5"),
+        input_shape=(224, 224, 3),
+        loader=_load_shared_model if SHARED_WEIGHTS_DIR else None,
+        pinned_sha256=os.environ.get("KHAIRE_VERIFIER_SHA256"),
+    )
+registry.register(
+    "fundus_classifier",
+    os.environ.get("KHAIRE_CLASSIFIER_MODEL", "fundus_classifier.keras"),
+    loader=_load_shared_model if SHARED_WEIGHTS_DIR else None,
+    compile_model=True,
+    pinned_sha256=os.environ.get("KHAIRE_CLASSIFIER_SHA256"),
+)
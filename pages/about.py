@@ -1,6 +1,5 @@
 import streamlit as st
-from Pillow import Image
-import model
+import model_info
 
 # Set page config
 st.set_page_config(
@@ -40,7 +39,7 @@ Our platform utilizes advanced deep learning models trained on extensive dataset
 """)
 
 # Display the model versions
-model_versions = model.get_model_versions()
+model_versions = model_info.get_model_versions()
 st.markdown("### Current Model Versions")
 
 # Create two columns
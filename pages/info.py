@@ -1,5 +1,5 @@
 import streamlit as st
-import model
+import model_info
 
 # Set page config
 st.set_page_config(
@@ -28,7 +28,7 @@ tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
 
 # Alzheimer's/Dementia Tab
 with tab1:
-    alzheimers_info = model.get_condition_info("alzheimers")
+    alzheimers_info = model_info.get_condition_info("alzheimers")
     
     st.markdown(f"## {alzheimers_info['name']}")
     
@@ -103,7 +103,7 @@ with tab2:
 
 # Diabetes Tab
 with tab3:
-    diabetes_info = model.get_condition_info("diabetes")
+    diabetes_info = model_info.get_condition_info("diabetes")
     
     st.markdown(f"## {diabetes_info['name']}")
     
@@ -137,7 +137,7 @@ with tab3:
 
 # Blood Pressure Tab
 with tab4:
-    hypertension_info = model.get_condition_info("hypertension")
+    hypertension_info = model_info.get_condition_info("hypertension")
     
     st.markdown(f"## {hypertension_info['name']}")
     
@@ -172,7 +172,7 @@ with tab4:
 
 # Diabetic Retinopathy Tab
 with tab5:
-    dr_info = model.get_condition_info("dr")
+    dr_info = model_info.get_condition_info("dr")
     
     st.markdown(f"## {dr_info['name']}")
     
@@ -211,7 +211,7 @@ with tab5:
 
 # Age-related Macular Degeneration Tab
 with tab6:
-    amd_info = model.get_condition_info("amd")
+    amd_info = model_info.get_condition_info("amd")
     
     st.markdown(f"## {amd_info['name']}")
     
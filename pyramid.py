@@ -0,0 +1,150 @@
+import threading
+
+import numpy as np
+
+from image_buffer import ImageBuffer
+
+# ImageNet channel statistics, for models trained with torchvision-style inputs
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+NORMALIZATIONS = ("none", "unit", "symmetric", "imagenet")
+
+
+class InputSpec:
+    """
+    The input a model expects.
+
+    Attributes:
+        size (tuple): (width, height) in pixels
+        dtype (np.dtype): Element type of the tensor
+        normalization (str): "none" keeps 0-255 values, "unit" scales to
+            [0, 1], "symmetric" to [-1, 1] and "imagenet" standardizes each
+            channel with the ImageNet mean and std
+    """
+
+    def __init__(self, size, dtype=np.float32, normalization="unit"):
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization: {normalization}")
+        self.size = tuple(size)
+        self.dtype = np.dtype(dtype)
+        self.normalization = normalization
+
+    @property
+    def key(self):
+        return (self.size, self.dtype.str, self.normalization)
+
+    def __repr__(self):
+        return f"InputSpec(size={self.size}, dtype={self.dtype.name}, normalization={self.normalization!r})"
+
+
+def normalize(array, spec):
+    """
+    Convert a uint8 RGB array into ``spec``'s dtype and value range.
+
+    Args:
+        array (np.ndarray): uint8 (H, W, 3) array already at ``spec.size``
+        spec (InputSpec): Target format
+
+    Returns:
+        np.ndarray: New array; ``array`` itself only when no conversion is needed
+    """
+    if spec.normalization == "none":
+        return array if array.dtype == spec.dtype else array.astype(spec.dtype)
+
+    tensor = array.astype(np.float32)
+    if spec.normalization == "unit":
+        tensor /= 255.0
+    elif spec.normalization == "symmetric":
+        tensor /= 127.5
+        tensor -= 1.0
+    else:
+        tensor /= 255.0
+        tensor -= IMAGENET_MEAN
+        tensor /= IMAGENET_STD
+    return tensor if spec.dtype == np.float32 else tensor.astype(spec.dtype)
+
+
+class ImagePyramid:
+    """
+    Resolutions and model inputs of one image, each computed at most once.
+
+    Every level is made by an area-averaging resize from the smallest level
+    already held that covers it, so building 512 then 224 resizes the full
+    frame only once. Model inputs are normalized from the matching level
+    and cached by spec, so models that share a spec share one read-only
+    tensor. Safe to use from several threads.
+    """
+
+    def __init__(self, image):
+        base = ImageBuffer.from_any(image)
+        self._levels = {base.size: base.array}
+        self._inputs = {}
+        self._lock = threading.Lock()
+        self.base = base
+        self.base_size = base.size
+
+    def add_level(self, array):
+        """Register a level computed elsewhere (uint8 RGB) so it is reused."""
+        buffer = ImageBuffer.from_any(array)
+        with self._lock:
+            self._levels.setdefault(buffer.size, buffer.array)
+
+    def level(self, size):
+        """
+        Get the image at ``size``.
+
+        Args:
+            size (tuple): (width, height)
+
+        Returns:
+            np.ndarray: Read-only uint8 (height, width, 3) array
+        """
+        size = tuple(size)
+        with self._lock:
+            array = self._levels.get(size)
+            if array is None:
+                array = self._resize_from_nearest(size)
+                array.setflags(write=False)
+                self._levels[size] = array
+            return array
+
+    def input_for(self, spec):
+        """
+        Get the tensor a model with input ``spec`` expects.
+
+        Returns:
+            np.ndarray: Read-only array of shape (height, width, 3)
+        """
+        tensor = self._inputs.get(spec.key)
+        if tensor is None:
+            level = self.level(spec.size)
+            with self._lock:
+                tensor = self._inputs.get(spec.key)
+                if tensor is None:
+                    tensor = normalize(level, spec)
+                    tensor.setflags(write=False)
+                    self._inputs[spec.key] = tensor
+        return tensor
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            arrays = list(self._levels.values()) + list(self._inputs.values())
+        return sum(array.nbytes for array in arrays)
+
+    def _resize_from_nearest(self, size):
+        # Imported here so that importing model, which builds InputSpecs at
+        # module level, does not load OpenCV
+        import cv2
+
+        width, height = size
+        covering = [s for s in self._levels if s[0] >= width and s[1] >= height]
+        if covering:
+            source = self._levels[min(covering, key=lambda s: s[0] * s[1])]
+            interpolation = cv2.INTER_AREA
+        else:
+            # Upscaling; start from the largest level
+            source = self._levels[max(self._levels, key=lambda s: s[0] * s[1])]
+            interpolation = cv2.INTER_LINEAR
+        return cv2.resize(source, size, interpolation=interpolation)
@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+
+from image_buffer import as_rgb_array
+
+# Quality is measured on a small copy; the verifier thumbnail is already this size
+QUALITY_SIZE = (224, 224)
+
+# Pixels darker than this are outside the camera's circular field of view
+FOV_THRESHOLD = 20
+# Within the field of view, pixels darker/brighter than these are badly exposed
+UNDEREXPOSED_LEVEL = 25
+OVEREXPOSED_LEVEL = 240
+# Glare is near-white in every channel; the optic disc stays below this in blue
+GLARE_LEVEL = 245
+
+# Limits an image must meet to be analyzed
+MIN_SHARPNESS = 15.0
+MIN_BRIGHTNESS = 40.0
+MAX_BRIGHTNESS = 200.0
+MAX_BADLY_EXPOSED_FRACTION = 0.35
+MIN_FOV_COVERAGE = 0.25
+MAX_GLARE_FRACTION = 0.05
+
+SUGGESTIONS = {
+    "sharpness": "The image looks blurry. Hold the camera steady and refocus on the retina.",
+    "underexposed": "The image is too dark. Increase the illumination or move to a brighter setting.",
+    "overexposed": "The image is overexposed. Reduce the flash or illumination.",
+    "fov_coverage": "The retina fills too little of the frame. Center the eye and move the camera closer.",
+    "glare": "There are strong reflections in the image. Adjust the camera angle to avoid glare.",
+}
+
+
+def _downsample(rgb):
+    height, width = rgb.shape[:2]
+    if (width, height) == QUALITY_SIZE:
+        return rgb
+    return cv2.resize(rgb, QUALITY_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def measure_quality(image):
+    """
+    Compute raw image-quality metrics on a downsampled copy.
+
+    Args:
+        image: ImageBuffer, PIL Image or RGB array
+
+    Returns:
+        dict: sharpness (Laplacian variance inside the field of view),
+            brightness (mean gray level inside it), underexposed and
+            overexposed fractions, fov_coverage and glare fraction
+    """
+    rgb = _downsample(as_rgb_array(image))
+    gray = rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    fov = gray > FOV_THRESHOLD
+    fov_pixels = max(int(fov.sum()), 1)
+
+    # 4-neighbour Laplacian, only where the whole stencil is inside the field
+    # of view so the edge of the circular mask does not count as detail
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    interior = fov[1:-1, 1:-1] & fov[:-2, 1:-1] & fov[2:, 1:-1] & fov[1:-1, :-2] & fov[1:-1, 2:]
+    sharpness = float(laplacian[interior].var()) if interior.any() else 0.0
+
+    fov_gray = gray[fov]
+    glare = np.all(rgb >= GLARE_LEVEL, axis=-1) & fov
+    return {
+        "sharpness": round(sharpness, 2),
+        "brightness": round(float(fov_gray.mean()) if fov_gray.size else 0.0, 2),
+        "underexposed": round(float((fov_gray < UNDEREXPOSED_LEVEL).sum()) / fov_pixels, 4),
+        "overexposed": round(float((fov_gray > OVEREXPOSED_LEVEL).sum()) / fov_pixels, 4),
+        "fov_coverage": round(float(fov.mean()), 4),
+        "glare": round(float(glare.sum()) / fov_pixels, 4),
+    }
+
+
+def assess_image_quality(image):
+    """
+    Decide whether an image is good enough to analyze.
+
+    Runs in a few milliseconds, so it can gate uploads before the verifier
+    and condition models are loaded or run.
+
+    Args:
+        image: ImageBuffer, PIL Image or RGB array
+
+    Returns:
+        dict: quality_score (0-100), is_suitable, improvement_suggestions
+            and the raw metrics, in the shape of the ``image_quality``
+            block of the analysis results
+    """
+    metrics = measure_quality(image)
+
+    # Each check scores 0-1, reaching 1 at a comfortable margin past its limit
+    checks = {
+        "sharpness": min(metrics["sharpness"] / (2 * MIN_SHARPNESS), 1.0),
+        "underexposed": min(
+            metrics["brightness"] / (1.5 * MIN_BRIGHTNESS),
+            1.0 - metrics["underexposed"] / (2 * MAX_BADLY_EXPOSED_FRACTION),
+        ),
+        "overexposed": min(
+            (255 - metrics["brightness"]) / (1.5 * (255 - MAX_BRIGHTNESS)),
+            1.0 - metrics["overexposed"] / (2 * MAX_BADLY_EXPOSED_FRACTION),
+        ),
+        "fov_coverage": min(metrics["fov_coverage"] / (1.5 * MIN_FOV_COVERAGE), 1.0),
+        "glare": 1.0 - min(metrics["glare"] / (2 * MAX_GLARE_FRACTION), 1.0),
+    }
+    failed = {
+        "sharpness": metrics["sharpness"] < MIN_SHARPNESS,
+        "underexposed": metrics["brightness"] < MIN_BRIGHTNESS
+        or metrics["underexposed"] > MAX_BADLY_EXPOSED_FRACTION,
+        "overexposed": metrics["brightness"] > MAX_BRIGHTNESS
+        or metrics["overexposed"] > MAX_BADLY_EXPOSED_FRACTION,
+        "fov_coverage": metrics["fov_coverage"] < MIN_FOV_COVERAGE,
+        "glare": metrics["glare"] > MAX_GLARE_FRACTION,
+    }
+
+    score = 100 * float(np.mean([max(0.0, min(value, 1.0)) for value in checks.values()]))
+    if any(failed.values()):
+        # Unusable images never score as passable, however good the rest is
+        score = min(score, 49)
+    return {
+        "quality_score": round(score),
+        "is_suitable": not any(failed.values()),
+        "improvement_suggestions": [SUGGESTIONS[name] for name, bad in failed.items() if bad],
+        "metrics": metrics,
+    }
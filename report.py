@@ -0,0 +1,251 @@
+import base64
+import html
+import io
+import textwrap
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Format name -> (MIME type, file extension)
+REPORT_FORMATS = {
+    "pdf": ("application/pdf", "pdf"),
+    "html": ("text/html", "html"),
+}
+
+DISCLAIMER = (
+    "These results are preliminary and for informational purposes only. They are not a "
+    "substitute for professional medical advice, diagnosis, or treatment. Always seek the "
+    "advice of your physician or other qualified health provider with any questions you may "
+    "have regarding a medical condition."
+)
+
+# Report images in display order: (key in the images dict, caption)
+REPORT_IMAGES = [
+    ("processed_image", "Processed Retinal Image"),
+    ("roi_overlay", "Optic Cup Detection"),
+]
+
+# PDF pages are A4 at 100 DPI
+PAGE_SIZE = (827, 1169)
+PAGE_DPI = 100
+PAGE_MARGIN = 60
+
+
+def _percent(value):
+    try:
+        return f"{float(value):.1f}%"
+    except (TypeError, ValueError):
+        return "N/A"
+
+
+def report_sections(results):
+    """
+    Flatten an analysis results dict into the report's sections.
+
+    Args:
+        results (dict): Results from ``model.predict_health_conditions``
+
+    Returns:
+        list: (heading, [(label, value), ...]) pairs, in display order
+    """
+    def get(section):
+        return results.get(section) or {}
+
+    alzheimer = get("alzheimer_risk")
+    neuro = get("neurological_health")
+    diabetes = get("diabetes")
+    bp = get("blood_pressure")
+    glaucoma = get("glaucoma")
+    dr = get("diabetic_retinopathy")
+    amd = get("amd")
+    demographics = get("demographics")
+
+    # A ratio of 0.0 is a real measurement; only a missing one is N/A
+    cup_to_disc_ratio = glaucoma.get("cup_to_disc_ratio")
+
+    sections = [
+        ("Health Risks", [
+            ("Alzheimer's/Dementia Risk", f"{alzheimer.get('risk_level', 'N/A')} (score {alzheimer.get('risk_score', 'N/A')})"),
+            ("Neurological Health", f"{neuro.get('status', 'N/A')} (score {neuro.get('score', 'N/A')})"),
+            ("Diabetes Indicators", f"{diabetes.get('risk_level', 'N/A')} (confidence {_percent(diabetes.get('confidence'))})"),
+            ("Blood Pressure", f"{bp.get('status', 'N/A')}, estimated {bp.get('systolic_estimate', 'N/A')}/{bp.get('diastolic_estimate', 'N/A')} mmHg"),
+        ]),
+        ("Ocular Conditions", [
+            ("Glaucoma", f"{glaucoma.get('status', 'N/A')} (confidence {_percent(glaucoma.get('confidence'))})"),
+            ("Cup-to-Disc Ratio", "N/A" if cup_to_disc_ratio is None else str(cup_to_disc_ratio)),
+            ("Diabetic Retinopathy", f"{dr.get('stage', 'N/A')} (confidence {_percent(dr.get('confidence'))})"),
+            ("Age-related Macular Degeneration", f"{amd.get('status', 'N/A')} (confidence {_percent(amd.get('confidence'))})"),
+        ]),
+        ("Demographic Predictions", [
+            ("Estimated Age", f"{demographics.get('age', 'N/A')} years (range {demographics.get('age_range', 'N/A')})"),
+            ("Predicted Gender", f"{demographics.get('gender', 'N/A')} (confidence {_percent(demographics.get('gender_confidence'))})"),
+            ("Predicted Ethnicity", f"{demographics.get('ethnicity', 'N/A')} (confidence {_percent(demographics.get('ethnicity_confidence'))})"),
+        ]),
+    ]
+
+    image_quality = get("image_quality")
+    if "quality_score" in image_quality:
+        sections.append(("Image Quality", [("Quality Score", f"{image_quality['quality_score']}/100")]))
+    
+    other = results.get("other_conditions")
+    if other:
+        sections[1][1].append(("Other Detected Conditions", ", ".join(other)))
+    return sections
+
+
+def build_html_report(results, images=None, generated_at=None):
+    """
+    Render the analysis as a standalone HTML document.
+
+    Images are embedded so the file can be opened offline.
+
+    Args:
+        results (dict): Analysis results
+        images (dict): Encoded JPEG or PNG bytes keyed as in REPORT_IMAGES
+        generated_at (str): Timestamp shown in the header; defaults to now
+
+    Returns:
+        bytes: UTF-8 encoded HTML
+    """
+    images = images or {}
+    generated_at = generated_at or time.strftime("%Y-%m-%d %H:%M")
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>",
+        "<title>Khaire Health Retinal Analysis Report</title>",
+        "<style>body{font-family:sans-serif;max-width:800px;margin:2em auto;color:#222}"
+        "h1{color:#4CAF50}td{padding:4px 12px 4px 0;vertical-align:top}"
+        "figure{margin:1em 0}img{max-width:100%}.disclaimer{font-size:0.9em;color:#555}</style>",
+        "</head><body>",
+        "<h1>Khaire Health</h1><h2>Retinal Analysis Report</h2>",
+        f"<p>Generated {html.escape(generated_at)}</p>",
+    ]
+
+    for heading, rows in report_sections(results):
+        parts.append(f"<h3>{html.escape(heading)}</h3><table>")
+        for label, value in rows:
+            parts.append(f"<tr><td><b>{html.escape(label)}</b></td><td>{html.escape(value)}</td></tr>")
+        parts.append("</table>")
+
+    for key, caption in REPORT_IMAGES:
+        data = images.get(key)
+        if data is None:
+            continue
+        mime = "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+        encoded = base64.b64encode(data).decode()
+        parts.append(
+            f"<figure><img src='data:{mime};base64,{encoded}' alt='{html.escape(caption)}'>"
+            f"<figcaption>{html.escape(caption)}</figcaption></figure>"
+        )
+
+    parts.append(f"<hr><p class='disclaimer'><b>IMPORTANT DISCLAIMER</b>: {html.escape(DISCLAIMER)}</p>")
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+class _PdfLayout:
+    """Lays text and images out top to bottom over as many pages as needed."""
+
+    def __init__(self):
+        self.pages = []
+        self.fonts = {size: ImageFont.load_default(size) for size in (28, 18, 14)}
+        self._new_page()
+
+    def _new_page(self):
+        self.page = Image.new("RGB", PAGE_SIZE, "white")
+        self.draw = ImageDraw.Draw(self.page)
+        self.pages.append(self.page)
+        self.y = PAGE_MARGIN
+
+    def _ensure_space(self, height):
+        if self.y + height > PAGE_SIZE[1] - PAGE_MARGIN:
+            self._new_page()
+
+    def text(self, text, size=14, bold=False, color="black", indent=0, spacing=6):
+        font = self.fonts[size]
+        # Approximate characters per line from the font's average glyph width
+        char_width = max(1, font.getlength("abcdefghijklmnopqrstuvwxyz") / 26)
+        width = int((PAGE_SIZE[0] - 2 * PAGE_MARGIN - indent) / char_width)
+        for line in textwrap.wrap(text, width) or [""]:
+            self._ensure_space(size + spacing)
+            position = (PAGE_MARGIN + indent, self.y)
+            self.draw.text(position, line, fill=color, font=font, stroke_width=1 if bold else 0, stroke_fill=color)
+            self.y += size + spacing
+
+    def gap(self, height):
+        self.y += height
+
+    def image(self, data, caption):
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        max_width = PAGE_SIZE[0] - 2 * PAGE_MARGIN
+        max_height = PAGE_SIZE[1] // 2
+        img.thumbnail((max_width, max_height))
+        self._ensure_space(img.height + 30)
+        self.page.paste(img, (PAGE_MARGIN, self.y))
+        self.y += img.height + 6
+        self.text(caption, size=14, color="gray")
+        self.gap(12)
+
+
+def build_pdf_report(results, images=None, generated_at=None):
+    """
+    Render the analysis as a PDF.
+
+    Pages are drawn with PIL and saved as a multi-page PDF, so no PDF
+    library is needed.
+
+    Args:
+        results (dict): Analysis results
+        images (dict): Encoded JPEG or PNG bytes keyed as in REPORT_IMAGES
+        generated_at (str): Timestamp shown in the header; defaults to now
+
+    Returns:
+        bytes: PDF document
+    """
+    images = images or {}
+    generated_at = generated_at or time.strftime("%Y-%m-%d %H:%M")
+    layout = _PdfLayout()
+
+    layout.text("Khaire Health", size=28, bold=True, color="#4CAF50")
+    layout.text("Retinal Analysis Report", size=18)
+    layout.text(f"Generated {generated_at}", size=14, color="gray")
+    layout.gap(16)
+
+    for heading, rows in report_sections(results):
+        layout.text(heading, size=18, bold=True)
+        for label, value in rows:
+            layout.text(f"{label}: {value}", indent=12)
+        layout.gap(12)
+
+    for key, caption in REPORT_IMAGES:
+        data = images.get(key)
+        if data is not None:
+            layout.image(data, caption)
+
+    layout.gap(12)
+    layout.text("IMPORTANT DISCLAIMER", bold=True)
+    layout.text(DISCLAIMER, color="#555555")
+
+    buffer = io.BytesIO()
+    layout.pages[0].save(
+        buffer,
+        format="PDF",
+        save_all=True,
+        append_images=layout.pages[1:],
+        resolution=PAGE_DPI,
+        title="Khaire Health Retinal Analysis Report",
+    )
+    return buffer.getvalue()
+
+
+def build_report(results, images=None, report_format="pdf"):
+    """
+    Build a report in one of REPORT_FORMATS.
+
+    Returns:
+        bytes: The encoded report
+    """
+    if report_format == "pdf":
+        return build_pdf_report(results, images)
+    if report_format == "html":
+        return build_html_report(results, images)
+    raise ValueError(f"Unknown report format: {report_format}")
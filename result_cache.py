@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(image_bytes, model_versions):
+    """
+    Build a content-addressed cache key for an analysis.
+
+    Args:
+        image_bytes (bytes): Raw bytes of the uploaded image file
+        model_versions (dict): Output of ``model.get_model_versions()``
+
+    Returns:
+        str: Hex digest identifying this image under these model versions
+    """
+    digest = hashlib.sha256()
+    digest.update(image_bytes)
+    digest.update(json.dumps(model_versions, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MemoryTier:
+    """In-process LRU tier bounded by entry count and entry age."""
+
+    def __init__(self, max_entries=64, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskTier:
+    """
+    On-disk tier storing pickled entries in a directory.
+
+    Entries are evicted oldest-access-first once the directory grows past
+    ``max_bytes``, and treated as missing once older than ``ttl_seconds``.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl_seconds is not None and time.time() - stat.st_mtime > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            # Record the access so size-based eviction keeps recently used entries
+            os.utime(path, (time.time(), stat.st_mtime))
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading result cache entry {key}: {e}")
+            return None
+
+    def put(self, key, value):
+        try:
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            print(f"Error writing result cache entry {key}: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            now = time.time()
+            for name in os.listdir(self.directory):
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if self.ttl_seconds is not None and now - stat.st_mtime > self.ttl_seconds:
+                    os.remove(path)
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+
+
+class ResultCache:
+    """
+    Two-tier cache for finished analyses.
+
+    Values are looked up in memory first, then on disk; disk hits are
+    promoted back into the memory tier.
+    """
+
+    def __init__(self, memory_tier=None, disk_tier=None):
+        self.memory_tier = memory_tier if memory_tier is not None else MemoryTier()
+        self.disk_tier = disk_tier
+
+    def get(self, key):
+        value = self.memory_tier.get(key)
+        if value is None and self.disk_tier is not None:
+            value = self.disk_tier.get(key)
+            if value is not None:
+                self.memory_tier.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory_tier.put(key, value)
+        if self.disk_tier is not None:
+            self.disk_tier.put(key, value)
+
+    def clear(self):
+        self.memory_tier.clear()
+        if self.disk_tier is not None:
+            self.disk_tier.clear()
+
+
+def create_result_cache_from_env():
+    """
+    Build a ResultCache configured from environment variables.
+
+    KHAIRE_RESULT_CACHE_ENTRIES and KHAIRE_RESULT_CACHE_TTL size the memory
+    tier. Setting KHAIRE_RESULT_CACHE_DIR enables the disk tier, sized by
+    KHAIRE_RESULT_CACHE_DISK_MB and KHAIRE_RESULT_CACHE_DISK_TTL.
+
+    Returns:
+        ResultCache: Configured cache instance
+    """
+    memory_tier = MemoryTier(
+        max_entries=int(os.environ.get("KHAIRE_RESULT_CACHE_ENTRIES", "64")),
+        ttl_seconds=float(os.environ.get("KHAIRE_RESULT_CACHE_TTL", "3600")),
+    )
+
+    disk_tier = None
+    cache_dir = os.environ.get("KHAIRE_RESULT_CACHE_DIR")
+    if cache_dir:
+        disk_tier = DiskTier(
+            cache_dir,
+            max_bytes=int(float(os.environ.get("KHAIRE_RESULT_CACHE_DISK_MB", "512")) * 1024 * 1024),
+            ttl_seconds=float(os.environ.get("KHAIRE_RESULT_CACHE_DISK_TTL", str(7 * 24 * 3600))),
+        )
+
+    return ResultCache(memory_tier, disk_tier)
@@ -2,6 +2,411 @@ import cv2
 import numpy as np
 from PIL import Image
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from image_buffer import ImageBuffer
+
+# Detection parameters shared by the single-image and batch paths
+THRESHOLD_VALUE = 180
+DILATION_KERNEL = np.ones((10, 10), np.uint8)
+BBOX_PADDING = 100
+
+# Opt-in coarse-to-fine search for images whose long side is at least
+# MULTISCALE_MIN_SIZE. It is faster but can pick a different cup than the
+# full-frame search, see measure_cup_multiscale, so it is off by default
+MULTISCALE_ENABLED = os.environ.get("KHAIRE_ROI_MULTISCALE", "0") == "1"
+MULTISCALE_MIN_SIZE = 1024
+COARSE_SIZE = 512
+
+# Images with at least this many pixels are thresholded and dilated tile by
+# tile, keeping the working buffers of all tiles under TILE_MEMORY_CAP_BYTES
+TILED_MIN_PIXELS = 16_000_000
+TILE_MEMORY_CAP_BYTES = int(float(os.environ.get("KHAIRE_ROI_TILE_MEMORY_MB", "64")) * 1024 * 1024)
+MIN_TILE_SIZE = 256
+# Gray, threshold and dilated masks (1 byte each) plus int32 component labels
+_TILE_BYTES_PER_PIXEL = 7
+# Tiles overlap by this much so dilation at tile edges matches the full frame
+_TILE_HALO = DILATION_KERNEL.shape[0]
+
+# OpenCV's fixed-point RGB->gray coefficients (scaled by 2**14). The
+# vectorized batch threshold then agrees with cv2.cvtColor + cv2.threshold
+# on all but 237 of the 2**24 RGB colours; cvtColor's SIMD paths round a
+# little differently, and every disagreement is a pixel whose gray level is
+# within one of THRESHOLD_VALUE, so masks can differ by isolated edge pixels
+_GRAY_SHIFT = 14
+_GRAY_WEIGHTS_RGB = (4899, 9617, 1868)
+
+
+def assess_glaucoma_risk(cup_to_disc_ratio):
+    """
+    Map a cup-to-disc ratio to a glaucoma risk level and confidence.
+    
+    Note: These thresholds are examples and should be validated in a clinical setting
+    
+    Args:
+        cup_to_disc_ratio (float): Estimated cup-to-disc ratio
+        
+    Returns:
+        tuple: (risk level, confidence percentage capped at 99)
+    """
+    if cup_to_disc_ratio > 0.7:
+        risk = "High"
+        confidence = 85.0 + (cup_to_disc_ratio - 0.7) * 50
+    elif cup_to_disc_ratio > 0.5:
+        risk = "Moderate"
+        confidence = 60.0 + (cup_to_disc_ratio - 0.5) * 125
+    else:
+        risk = "Low"
+        confidence = max(40.0 + cup_to_disc_ratio * 40, 25.0)
+    return risk, min(confidence, 99.0)
+
+
+def find_cup_contour(thresh):
+    """
+    Dilate a threshold mask and return its largest external contour.
+    
+    Args:
+        thresh (np.ndarray): uint8 mask of bright pixels
+        
+    Returns:
+        np.ndarray: Largest contour, or None if the mask is empty
+    """
+    # Apply morphological operations
+    dilated = cv2.morphologyEx(thresh, cv2.MORPH_DILATE, DILATION_KERNEL)
+    
+    # Find contours
+    contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    
+    # Find largest contour (assumed to be optic cup)
+    return max(contours, key=cv2.contourArea)
+
+
+def measure_cup(thresh, padding=BBOX_PADDING, offset=(0, 0), frame_shape=None):
+    """
+    Locate the optic cup in a binary threshold mask.
+    
+    Args:
+        thresh (np.ndarray): uint8 mask of bright pixels
+        padding (int): Padding added around the cup to estimate the disc
+        offset (tuple): (x, y) position of the mask within the full frame,
+            when ``thresh`` only covers a window of it
+        frame_shape (tuple): Shape of the full frame, defaults to the mask's shape
+        
+    Returns:
+        tuple: (padded bbox, largest contour, cup-to-disc ratio) in frame
+            coordinates, or None if no candidate region was found
+    """
+    largest_contour = find_cup_contour(thresh)
+    if largest_contour is None:
+        return None
+    
+    if offset != (0, 0):
+        largest_contour = largest_contour + np.array(offset, dtype=largest_contour.dtype)
+    return _measure_contour(largest_contour, padding, frame_shape or thresh.shape)
+
+
+def _measure_contour(largest_contour, padding, frame_shape):
+    # Get bounding box coordinates
+    x, y, w, h = cv2.boundingRect(largest_contour)
+    
+    # Add padding to bounding box
+    height, width = frame_shape[:2]
+    x_pad = max(0, x - padding)
+    y_pad = max(0, y - padding)
+    w_pad = min(w + (2 * padding), width - x_pad)
+    h_pad = min(h + (2 * padding), height - y_pad)
+    
+    # Calculate cup-to-disc ratio (simplified estimate)
+    # In a real implementation, this would use more sophisticated methods
+    cup_area = cv2.contourArea(largest_contour)
+    # Estimate disc area with padding
+    disc_area = (w_pad * h_pad)
+    cup_to_disc_ratio = min(cup_area / max(disc_area, 1), 1.0)
+    
+    return (x_pad, y_pad, w_pad, h_pad), largest_contour, cup_to_disc_ratio
+
+
+def _threshold_rgb(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    _, thresh = cv2.threshold(gray, THRESHOLD_VALUE, 255, cv2.THRESH_BINARY)
+    return thresh
+
+
+def _tile_grid(height, width, memory_cap, max_workers):
+    """Pick a tile size and worker count whose buffers fit in ``memory_cap``."""
+    workers = max_workers or os.cpu_count() or 1
+    min_tile_bytes = (MIN_TILE_SIZE + 2 * _TILE_HALO) ** 2 * _TILE_BYTES_PER_PIXEL
+    workers = max(1, min(workers, memory_cap // min_tile_bytes))
+    side = int(np.sqrt(memory_cap / (workers * _TILE_BYTES_PER_PIXEL))) - 2 * _TILE_HALO
+    side = max(MIN_TILE_SIZE, side)
+    cores = [
+        (y, min(y + side, height), x, min(x + side, width))
+        for y in range(0, height, side)
+        for x in range(0, width, side)
+    ]
+    return side, cores, workers
+
+
+def _tile_components(image, core):
+    # Threshold and dilate one tile plus its halo, then label the core
+    y0, y1, x0, x1 = core
+    height, width = image.shape[:2]
+    hy0, hx0 = max(0, y0 - _TILE_HALO), max(0, x0 - _TILE_HALO)
+    hy1, hx1 = min(height, y1 + _TILE_HALO), min(width, x1 + _TILE_HALO)
+    
+    thresh = _threshold_rgb(image[hy0:hy1, hx0:hx1])
+    if not cv2.countNonZero(thresh):
+        # Most of a fundus photo is below the threshold; skip labelling
+        return np.zeros((0, 5), np.int32), None
+    
+    dilated = cv2.morphologyEx(thresh, cv2.MORPH_DILATE, DILATION_KERNEL)
+    dilated = dilated[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(dilated, connectivity=8)
+    
+    # Only the tile's border labels are kept, for merging with neighbours
+    edges = {
+        "top": labels[0].copy(),
+        "bottom": labels[-1].copy(),
+        "left": labels[:, 0].copy(),
+        "right": labels[:, -1].copy(),
+    }
+    stats = stats[1:count].copy()
+    stats[:, cv2.CC_STAT_LEFT] += x0
+    stats[:, cv2.CC_STAT_TOP] += y0
+    return stats, edges
+
+
+def _merge_tile_components(results, side, width):
+    """
+    Join components that touch across tile borders into frame-wide components.
+    
+    Returns:
+        list: [x0, y0, x1, y1, area] of each merged component
+    """
+    tiles_per_row = (width + side - 1) // side
+    parent = {}
+    
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+    
+    def union(a, b):
+        parent[find(a)] = find(b)
+    
+    def join_edges(i, edge_a, j, edge_b):
+        # 8-connectivity: a border pixel touches the three facing neighbours
+        for shift in (-1, 0, 1):
+            a = edge_a[max(0, -shift):len(edge_a) - max(0, shift)]
+            b = edge_b[max(0, shift):len(edge_b) - max(0, -shift)]
+            for la, lb in set(zip(a[(a > 0) & (b > 0)].tolist(), b[(a > 0) & (b > 0)].tolist())):
+                union((i, la), (j, lb))
+    
+    for i, (stats, edges) in enumerate(results):
+        if edges is None:
+            continue
+        col = i % tiles_per_row
+        right = i + 1 if col + 1 < tiles_per_row else None
+        below = i + tiles_per_row if i + tiles_per_row < len(results) else None
+        if right is not None and results[right][1] is not None:
+            join_edges(i, edges["right"], right, results[right][1]["left"])
+        if below is None:
+            continue
+        if results[below][1] is not None:
+            join_edges(i, edges["bottom"], below, results[below][1]["top"])
+        # Diagonal neighbours only meet at a single corner pixel
+        diagonals = []
+        if right is not None:
+            diagonals.append((below + 1, edges["bottom"][-1], "left"))
+        if col > 0:
+            diagonals.append((below - 1, edges["bottom"][0], "right"))
+        for j, label, facing in diagonals:
+            neighbour = results[j][1]
+            if label and neighbour is not None and neighbour[facing][0]:
+                union((i, int(label)), (j, int(neighbour[facing][0])))
+    
+    merged = {}
+    for i, (stats, _) in enumerate(results):
+        for label, (x, y, w, h, area) in enumerate(stats.tolist(), start=1):
+            root = find((i, label))
+            box = merged.get(root)
+            if box is None:
+                merged[root] = [x, y, x + w, y + h, area]
+            else:
+                box[0], box[1] = min(box[0], x), min(box[1], y)
+                box[2], box[3] = max(box[2], x + w), max(box[3], y + h)
+                box[4] += area
+    return list(merged.values())
+
+
+def measure_cup_tiled(image, padding=BBOX_PADDING, memory_cap=None, max_workers=None):
+    """
+    Locate the optic cup on a very large RGB image with bounded working memory.
+    
+    Grayscale conversion, thresholding and dilation run over tiles that
+    overlap by the dilation kernel size, in a thread pool (OpenCV releases
+    the GIL). Each tile is reduced to its connected components, which are
+    joined across tile borders. The largest joined component is then
+    re-measured on a window around it. Candidates are ranked by contour
+    area, as in ``find_cup_contour``, not by pixel count, so the cup
+    picked matches a full-frame search.
+    
+    Args:
+        image (np.ndarray): RGB image
+        padding (int): Padding added around the cup to estimate the disc
+        memory_cap (int): Bytes allowed for the buffers of the tiles being
+            processed at once, defaults to TILE_MEMORY_CAP_BYTES
+        max_workers (int): Thread pool size, defaults to the CPU count
+        
+    Returns:
+        tuple: Same as ``measure_cup``, in full-resolution coordinates
+    """
+    height, width = image.shape[:2]
+    side, cores, workers = _tile_grid(height, width, memory_cap or TILE_MEMORY_CAP_BYTES, max_workers)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda core: _tile_components(image, core), cores))
+    
+    components = _merge_tile_components(results, side, width)
+    if not components:
+        return None
+    
+    # A contour's area is at most its bounding box's, so once the next
+    # box is no larger than the best contour area found, nothing can beat it
+    best, best_area = None, -1.0
+    for x0, y0, x1, y1, _ in sorted(components, key=lambda c: (c[2] - c[0]) * (c[3] - c[1]), reverse=True):
+        if (x1 - x0) * (y1 - y0) <= best_area:
+            break
+        contour = _component_contour(image, (x0, y0, x1, y1))
+        area = cv2.contourArea(contour)
+        if area > best_area:
+            best, best_area = contour, area
+    return _measure_contour(best, padding, image.shape)
+
+
+def _component_contour(image, box):
+    """Outer contour, in frame coordinates, of the merged component with bounding box ``box``."""
+    x0, y0, x1, y1 = box
+    height, width = image.shape[:2]
+    wx0, wy0 = max(0, x0 - _TILE_HALO), max(0, y0 - _TILE_HALO)
+    wx1, wy1 = min(width, x1 + _TILE_HALO), min(height, y1 + _TILE_HALO)
+    dilated = cv2.morphologyEx(_threshold_rgb(image[wy0:wy1, wx0:wx1]), cv2.MORPH_DILATE, DILATION_KERNEL)
+    contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Other components may reach into the window; the one wanted is the
+    # contour whose bounding box is exactly the component's
+    target = (x0 - wx0, y0 - wy0, x1 - x0, y1 - y0)
+    contour = next((c for c in contours if cv2.boundingRect(c) == target), None)
+    if contour is None:
+        contour = max(contours, key=cv2.contourArea)
+    return contour + np.array((wx0, wy0), dtype=contour.dtype)
+
+
+def _measure_full_frame(image, padding=BBOX_PADDING, tiled=None):
+    if tiled is None:
+        tiled = image.shape[0] * image.shape[1] >= TILED_MIN_PIXELS
+    if tiled:
+        return measure_cup_tiled(image, padding)
+    return measure_cup(_threshold_rgb(image), padding)
+
+
+def measure_cup_multiscale(image, coarse_size=COARSE_SIZE, padding=BBOX_PADDING, tiled=None):
+    """
+    Locate the optic cup coarse-to-fine on a large RGB image.
+    
+    The brightest candidate region is found on a copy downsampled to
+    ``coarse_size`` pixels on its long side. Precise thresholding and contour
+    extraction then run only on the matching window of the full-resolution
+    image. Falls back to a full-frame search when the coarse pass finds
+    nothing or the window turns out to be too tight.
+    
+    The result can differ from the full-frame search. The coarse pass ranks
+    regions as they look after downsampling: a thin bright ring or a patch
+    of speckle can average out below the threshold, or neighbouring blobs
+    can merge, so the region picked may not be the one with the largest
+    full-resolution contour area. The cup-to-disc ratio, and with it the
+    glaucoma risk, then changes too; on synthetic frames with several
+    bright regions it did for 3 of 30 frames. With a single dominant bright
+    region the results match.
+    
+    Args:
+        image (np.ndarray): RGB image
+        coarse_size (int): Long side of the coarse pyramid level
+        padding (int): Padding added around the cup to estimate the disc
+        tiled (bool): Run full-frame fallbacks tile by tile, see ``measure_cup_tiled``
+        
+    Returns:
+        tuple: Same as ``measure_cup``, in full-resolution coordinates
+    """
+    height, width = image.shape[:2]
+    scale = coarse_size / max(height, width)
+    if scale >= 1.0:
+        return _measure_full_frame(image, padding, tiled)
+    
+    # Nearest-neighbour subsample to twice the coarse size first so the
+    # area-averaging pass only reads a fraction of the full frame
+    coarse_dims = (max(1, round(width * scale)), max(1, round(height * scale)))
+    small = image
+    if scale < 0.25:
+        small = cv2.resize(
+            image,
+            (coarse_dims[0] * 2, coarse_dims[1] * 2),
+            interpolation=cv2.INTER_NEAREST,
+        )
+    small = cv2.resize(small, coarse_dims, interpolation=cv2.INTER_AREA)
+    coarse_contour = find_cup_contour(_threshold_rgb(small))
+    if coarse_contour is None:
+        return _measure_full_frame(image, padding, tiled)
+    
+    # Map the coarse bbox back to full resolution with a margin covering
+    # resampling error and the dilation kernel
+    cx, cy, cw, ch = cv2.boundingRect(coarse_contour)
+    margin = int(np.ceil(2 / scale)) + DILATION_KERNEL.shape[0]
+    x0 = max(0, int(cx / scale) - margin)
+    y0 = max(0, int(cy / scale) - margin)
+    x1 = min(width, int(np.ceil((cx + cw) / scale)) + margin)
+    y1 = min(height, int(np.ceil((cy + ch) / scale)) + margin)
+    
+    thresh = _threshold_rgb(image[y0:y1, x0:x1])
+    cup = measure_cup(thresh, padding, offset=(x0, y0), frame_shape=image.shape)
+    if cup is None:
+        return _measure_full_frame(image, padding, tiled)
+    
+    # If the cup touches a window edge that is not also a frame edge, the
+    # window cut it off; redo the search on the full frame
+    x, y, w, h = cv2.boundingRect(cup[1])
+    if (x <= x0 and x0 > 0) or (y <= y0 and y0 > 0) or \
+            (x + w >= x1 and x1 < width) or (y + h >= y1 and y1 < height):
+        return _measure_full_frame(image, padding, tiled)
+    
+    return cup
+
+
+def threshold_stack(stack):
+    """
+    Threshold a stack of RGB images in one vectorized pass.
+    
+    Matches ``_threshold_rgb`` except for a few colours within one gray
+    level of the threshold, see ``_GRAY_WEIGHTS_RGB``.
+    
+    Args:
+        stack (np.ndarray): uint8 array of shape (N, H, W, 3) in RGB order
+        
+    Returns:
+        np.ndarray: uint8 masks of shape (N, H, W), 255 where gray > THRESHOLD_VALUE
+    """
+    r_weight, g_weight, b_weight = _GRAY_WEIGHTS_RGB
+    acc = stack[..., 0].astype(np.uint32)
+    acc *= r_weight
+    acc += stack[..., 1].astype(np.uint32) * g_weight
+    acc += stack[..., 2].astype(np.uint32) * b_weight
+    # gray = (acc + 2**13) >> 14, so gray > T  <=>  acc >= ((T + 1) << 14) - 2**13
+    limit = ((THRESHOLD_VALUE + 1) << _GRAY_SHIFT) - (1 << (_GRAY_SHIFT - 1))
+    masks = np.greater_equal(acc, limit).view(np.uint8)
+    masks *= 255
+    return masks
 
 class ROIDetector:
     """
@@ -12,6 +417,7 @@ class ROIDetector:
     """
     
     def __init__(self):
+        # Read-only RGB view of the loaded image; it is never modified in place
         self.image = None
         self.processed_image = None
         self.bbox = None
@@ -21,20 +427,19 @@ class ROIDetector:
         Load an image for processing.
         
         Args:
-            image: A PIL Image object or path to image file
+            image: An ImageBuffer, PIL Image, RGB array or path to image file
             
         Returns:
             bool: True if image loaded successfully
         """
         try:
-            # If PIL Image is passed, convert to OpenCV format
-            if isinstance(image, Image.Image):
-                img_array = np.array(image.convert('RGB'))
-                # Convert RGB to BGR (OpenCV format)
-                self.image = img_array[:, :, ::-1].copy()
+            if isinstance(image, (ImageBuffer, Image.Image, np.ndarray)):
+                # Share the caller's RGB pixels instead of copying them
+                self.image = ImageBuffer.from_any(image).array
             else:
                 # Assume it's a file path
-                self.image = cv2.imread(str(image))
+                bgr = cv2.imread(str(image))
+                self.image = None if bgr is None else cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
                 
             if self.image is None:
                 raise ValueError("Image could not be loaded or converted")
@@ -44,82 +449,57 @@ class ROIDetector:
             print(f"Error loading image: {e}")
             return False
     
-    def process_image(self):
+    def process_image(self, multiscale=None, tiled=None):
         """
         Process the image to detect the optic cup and assess glaucoma likelihood.
         
+        Args:
+            multiscale (bool): Search coarse-to-fine instead of over the full
+                frame; faster, but can pick a different cup, see
+                ``measure_cup_multiscale``. Defaults to off, or with
+                KHAIRE_ROI_MULTISCALE=1 to on for images whose long side is
+                at least MULTISCALE_MIN_SIZE pixels.
+            tiled (bool): Threshold and dilate full-frame searches tile by
+                tile to bound memory. Defaults to on for images with at least
+                TILED_MIN_PIXELS pixels.
+        
         Returns:
             dict: Detection results including bounding box, cup-to-disc ratio, and glaucoma risk assessment
         """
         if self.image is None:
             return None
             
-        # Create a copy for drawing
-        image_with_box = self.image.copy()
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        if multiscale is None:
+            multiscale = MULTISCALE_ENABLED and max(self.image.shape[:2]) >= MULTISCALE_MIN_SIZE
         
-        # Apply binary thresholding
-        _, thresh = cv2.threshold(gray, 180, 255, cv2.THRESH_BINARY)
-        
-        # Apply morphological operations
-        kernel = np.ones((10, 10), np.uint8)
-        dilated = cv2.morphologyEx(thresh, cv2.MORPH_DILATE, kernel)
-        
-        # Find contours
-        contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if not contours:
+        if multiscale:
+            cup = measure_cup_multiscale(self.image, tiled=tiled)
+        else:
+            # Convert to grayscale and apply binary thresholding
+            cup = _measure_full_frame(self.image, tiled=tiled)
+        if cup is None:
             return {
                 "detection_status": "No optic cup detected",
                 "glaucoma_risk": "Unknown",
                 "confidence": 0,
                 "cup_to_disc_ratio": None,
                 "bbox": None,
-                "processed_image": self.image
+                "processed_image": Image.fromarray(self.image)
             }
-            
-        # Find largest contour (assumed to be optic cup)
-        largest_contour = max(contours, key=cv2.contourArea)
-        
-        # Get bounding box coordinates
-        x, y, w, h = cv2.boundingRect(largest_contour)
+        (x_pad, y_pad, w_pad, h_pad), _, cup_to_disc_ratio = cup
         
-        # Add padding to bounding box
-        padding = 100
-        x_pad = max(0, x - padding)
-        y_pad = max(0, y - padding)
-        w_pad = min(w + (2 * padding), self.image.shape[1] - x_pad)
-        h_pad = min(h + (2 * padding), self.image.shape[0] - y_pad)
-        
-        # Draw rectangle on image
+        # Drawing is the only write, so this is the only full-frame copy
+        image_with_box = self.image.copy()
         cv2.rectangle(
             image_with_box,
             (x_pad, y_pad),
             (x_pad + w_pad, y_pad + h_pad),
-            (255, 0, 0),
+            (0, 0, 255),
             2
         )
         
-        # Calculate cup-to-disc ratio (simplified estimate)
-        # In a real implementation, this would use more sophisticated methods
-        cup_area = cv2.contourArea(largest_contour)
-        # Estimate disc area with padding
-        disc_area = (w_pad * h_pad)
-        cup_to_disc_ratio = min(cup_area / max(disc_area, 1), 1.0)
-        
         # Assess glaucoma risk based on cup-to-disc ratio
-        # Note: These thresholds are examples and should be validated in a clinical setting
-        if cup_to_disc_ratio > 0.7:
-            risk = "High"
-            confidence = 85.0 + (cup_to_disc_ratio - 0.7) * 50
-        elif cup_to_disc_ratio > 0.5:
-            risk = "Moderate"
-            confidence = 60.0 + (cup_to_disc_ratio - 0.5) * 125
-        else:
-            risk = "Low"
-            confidence = max(40.0 + cup_to_disc_ratio * 40, 25.0)
+        risk, confidence = assess_glaucoma_risk(cup_to_disc_ratio)
             
         self.processed_image = image_with_box
         self.bbox = (x_pad, y_pad, w_pad, h_pad)
@@ -127,10 +507,59 @@ class ROIDetector:
         return {
             "detection_status": "Optic cup detected",
             "glaucoma_risk": risk,
-            "confidence": min(confidence, 99.0),  # Cap confidence at 99%
+            "confidence": confidence,
             "cup_to_disc_ratio": cup_to_disc_ratio,
             "bbox": self.bbox,
-            "processed_image": self.cv2_to_pil(image_with_box)
+            "processed_image": Image.fromarray(image_with_box)
+        }
+    
+    @staticmethod
+    def process_batch(stack, max_workers=None):
+        """
+        Detect the optic cup in a stack of images without building per-image results.
+        
+        Thresholding runs vectorized over the whole stack; dilation and contour
+        extraction run per image in a thread pool (OpenCV releases the GIL).
+        
+        Args:
+            stack (np.ndarray): uint8 array of shape (N, H, W, 3) in RGB order
+            max_workers (int): Thread pool size, defaults to the executor's default
+            
+        Returns:
+            dict: Arrays of length N: "detected" (bool), "bbox" (int32, Nx4,
+                -1 where nothing was detected), "cup_to_disc_ratio" (float32, NaN
+                where nothing was detected), "glaucoma_risk" (str) and
+                "confidence" (float32)
+        """
+        stack = np.asarray(stack)
+        if stack.ndim != 4 or stack.shape[-1] != 3 or stack.dtype != np.uint8:
+            raise ValueError("Expected a uint8 stack of shape (N, H, W, 3)")
+        
+        n = stack.shape[0]
+        masks = threshold_stack(stack)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            cups = list(executor.map(measure_cup, masks))
+        
+        bboxes = np.full((n, 4), -1, dtype=np.int32)
+        ratios = np.full(n, np.nan, dtype=np.float32)
+        risks = np.full(n, "Unknown", dtype="<U8")
+        confidences = np.zeros(n, dtype=np.float32)
+        
+        for i, cup in enumerate(cups):
+            if cup is None:
+                continue
+            bbox, _, ratio = cup
+            bboxes[i] = bbox
+            ratios[i] = ratio
+            risks[i], confidences[i] = assess_glaucoma_risk(ratio)
+        
+        return {
+            "detected": ~np.isnan(ratios),
+            "bbox": bboxes,
+            "cup_to_disc_ratio": ratios,
+            "glaucoma_risk": risks,
+            "confidence": confidences,
         }
         
     def cv2_to_pil(self, cv_image):
@@ -141,5 +570,5 @@ class ROIDetector:
     def get_processed_image(self):
         """Return the processed image with detections"""
         if self.processed_image is not None:
-            return self.cv2_to_pil(self.processed_image)
+            return Image.fromarray(self.processed_image)
         return None
@@ -0,0 +1,147 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from image_buffer import ImageBuffer
+
+
+class SessionArtifactStore:
+    """
+    Server-wide store for per-session images, kept as compressed bytes.
+
+    Streamlit keeps ``st.session_state`` alive for as long as the session
+    exists and never evicts anything in it, so images stored there pile up
+    at full resolution. This store keeps them encoded instead, caps the
+    bytes held for each session (least recently used artifacts go first),
+    and drops sessions that have been idle for longer than ``ttl_seconds``.
+    """
+
+    def __init__(self, session_budget_bytes=8 * 1024 * 1024, ttl_seconds=1800, sweep_interval=60):
+        self.session_budget_bytes = session_budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._sessions = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def put_image(self, session_id, key, image, format="JPEG", quality=90, max_side=None):
+        """
+        Encode and store an image for a session.
+
+        Args:
+            session_id (str): Owning session
+            key (str): Artifact name, e.g. "processed_image"
+            image: PIL Image, ImageBuffer or RGB array
+            format (str): "JPEG" for display copies, "PNG" when pixels must round-trip exactly
+            quality (int): JPEG quality
+            max_side (int): Downscale so the long side is at most this many pixels
+
+        Returns:
+            int: Encoded size in bytes
+        """
+        if isinstance(image, (ImageBuffer, np.ndarray)):
+            image = ImageBuffer.from_any(image).to_pil()
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if max_side is not None and max(image.size) > max_side:
+            image = image.copy()
+            image.thumbnail((max_side, max_side))
+
+        buffer = io.BytesIO()
+        if format == "JPEG":
+            image.save(buffer, format="JPEG", quality=quality)
+        else:
+            image.save(buffer, format=format, compress_level=1)
+        return self.put_bytes(session_id, key, buffer.getvalue())
+
+    def put_bytes(self, session_id, key, data):
+        """Store already-encoded bytes for a session."""
+        with self._lock:
+            artifacts = self._touch(session_id)
+            artifacts[key] = data
+            artifacts.move_to_end(key)
+            self._enforce_budget(artifacts)
+        self._maybe_sweep()
+        return len(data)
+
+    def get_bytes(self, session_id, key):
+        """Return the stored bytes, or None if missing or evicted."""
+        with self._lock:
+            artifacts = self._touch(session_id)
+            data = artifacts.get(key)
+            if data is not None:
+                artifacts.move_to_end(key)
+        self._maybe_sweep()
+        return data
+
+    def get_image(self, session_id, key):
+        """Decode a stored image back into a PIL Image, or None if missing."""
+        data = self.get_bytes(session_id, key)
+        if data is None:
+            return None
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return image
+
+    def discard(self, session_id, *keys):
+        with self._lock:
+            artifacts = self._sessions.get(session_id, {}).get("artifacts")
+            if artifacts is not None:
+                for key in keys:
+                    artifacts.pop(key, None)
+
+    def session_usage(self, session_id):
+        """Bytes held for one session."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return 0
+            return sum(len(data) for data in session["artifacts"].values())
+
+    def usage(self):
+        """
+        Report memory held across all sessions.
+
+        Returns:
+            dict: Session count, total bytes and the largest session's bytes
+        """
+        with self._lock:
+            sizes = [sum(len(d) for d in s["artifacts"].values()) for s in self._sessions.values()]
+        return {
+            "sessions": len(sizes),
+            "total_bytes": sum(sizes),
+            "max_session_bytes": max(sizes, default=0),
+        }
+
+    def sweep(self):
+        """Drop sessions idle for longer than the TTL; returns how many were dropped."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if s["last_access"] < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+            self._last_sweep = time.monotonic()
+        return len(expired)
+
+    def _touch(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = {"artifacts": OrderedDict(), "last_access": 0.0}
+            self._sessions[session_id] = session
+        session["last_access"] = time.monotonic()
+        return session["artifacts"]
+
+    def _enforce_budget(self, artifacts):
+        # Evict least recently used artifacts, but always keep the newest one
+        total = sum(len(data) for data in artifacts.values())
+        while total > self.session_budget_bytes and len(artifacts) > 1:
+            _, data = artifacts.popitem(last=False)
+            total -= len(data)
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
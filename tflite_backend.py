@@ -0,0 +1,370 @@
+"""
+TensorFlow Lite backend for the fundus verifier.
+
+Converts the Keras verifier to a quantized TFLite model and runs it with the
+TFLite interpreter. Selected at runtime with KHAIRE_VERIFIER_BACKEND=tflite.
+
+Also exports Keras models to shared weight files (KHAIRE_SHARED_WEIGHTS_DIR):
+unquantized TFLite flatbuffers that every worker process on a host
+memory-maps read-only, so the weights sit in the page cache once instead of
+in each process's private memory.
+
+Usage:
+    python tflite_backend.py convert --quantization float16
+    python tflite_backend.py convert --quantization int8 --samples sample_dir/
+    python tflite_backend.py compare --tflite fundus_verifier.int8.tflite --samples sample_dir/
+    python tflite_backend.py export-shared --keras fundus_classifier.keras --output-dir /var/cache/khaire
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+# Keras verifier that conversions start from and comparisons check against
+KERAS_VERIFIER_PATH = "fundus_verifier.h5"
+
+
+def _load_interpreter_class():
+    # The standalone tflite_runtime wheel is far smaller than TensorFlow;
+    # fall back to the interpreter bundled with TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter, OpResolverType
+    except ImportError:
+        import tensorflow as tf
+
+        Interpreter = tf.lite.Interpreter
+        OpResolverType = tf.lite.experimental.OpResolverType
+    return Interpreter, OpResolverType
+
+
+class TFLiteModel:
+    """
+    A TFLite model exposing the ``predict_on_batch`` interface of a Keras model.
+
+    Each batch size gets its own interpreter, allocated the first time that
+    size arrives and kept afterwards, so alternating sizes never reallocate
+    tensors. With the BatchScheduler's fixed batch buckets that is a handful
+    of interpreters. They share the memory-mapped model file but each holds
+    its own activation buffers. Quantized int8 inputs and outputs are
+    converted to and from float32.
+    """
+
+    def __init__(self, path, num_threads=None, default_delegates=True):
+        """
+        Args:
+            path (str): .tflite model file
+            num_threads (int): Interpreter threads; None lets TFLite decide
+            default_delegates (bool): Apply TFLite's default XNNPack delegate.
+                XNNPack repacks weights into private memory, so shared
+                weight files turn it off and run the builtin kernels, which
+                read weights straight from the mapped file
+        """
+        self.path = path
+        self.num_threads = num_threads
+        self.default_delegates = default_delegates
+        # Batch size -> (interpreter, input details, output details, lock)
+        self._interpreters = {}
+        self._lock = threading.Lock()
+
+        # Load the model once up front so a bad file fails here, not on first use
+        interpreter = self._create_interpreter()
+        batch_size = int(interpreter.get_input_details()[0]["shape"][0])
+        self._interpreters[batch_size] = self._entry(interpreter)
+
+    def _create_interpreter(self, batch_size=None):
+        Interpreter, OpResolverType = _load_interpreter_class()
+        kwargs = {}
+        if not self.default_delegates:
+            kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        # model_path lets TFLite memory-map the file instead of copying it
+        interpreter = Interpreter(model_path=self.path, num_threads=self.num_threads, **kwargs)
+        if batch_size is not None:
+            input_details = interpreter.get_input_details()[0]
+            shape = list(input_details["shape"])
+            shape[0] = batch_size
+            interpreter.resize_tensor_input(input_details["index"], shape)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    @staticmethod
+    def _entry(interpreter):
+        return (
+            interpreter,
+            interpreter.get_input_details()[0],
+            interpreter.get_output_details()[0],
+            threading.Lock(),
+        )
+
+    def _interpreter_for(self, batch_size):
+        with self._lock:
+            entry = self._interpreters.get(batch_size)
+            if entry is None:
+                entry = self._entry(self._create_interpreter(batch_size))
+                self._interpreters[batch_size] = entry
+            return entry
+
+    def predict_on_batch(self, batch):
+        """
+        Run the model on a float32 batch.
+
+        Args:
+            batch (np.ndarray): Array of shape (N, H, W, C)
+
+        Returns:
+            np.ndarray: float32 model outputs of shape (N, ...)
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        interpreter, input_details, output_details, lock = self._interpreter_for(batch.shape[0])
+        # An interpreter is stateful, so calls with the same batch size are serialized
+        with lock:
+            input_dtype = input_details["dtype"]
+            if input_dtype != np.float32:
+                scale, zero_point = input_details["quantization"]
+                info = np.iinfo(input_dtype)
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(input_dtype)
+
+            interpreter.set_tensor(input_details["index"], batch)
+            interpreter.invoke()
+            output = interpreter.get_tensor(output_details["index"])
+
+            if output.dtype != np.float32:
+                scale, zero_point = output_details["quantization"]
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output
+
+
+def convert_to_tflite(keras_model, output_path, quantization="float16", representative_inputs=None):
+    """
+    Convert a Keras model to TFLite with optional post-training quantization.
+
+    Args:
+        keras_model: Loaded Keras model
+        output_path (str): Where to write the .tflite file
+        quantization (str): "none", "float16" (float16 weights) or "int8"
+            (full integer quantization calibrated on ``representative_inputs``)
+        representative_inputs (list): float32 sample inputs, required for int8
+
+    Returns:
+        int: Size of the written model in bytes
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {quantization}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if not representative_inputs:
+            raise ValueError("int8 quantization needs representative inputs for calibration")
+
+        def representative_dataset():
+            for sample in representative_inputs:
+                yield [np.asarray(sample, dtype=np.float32)[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    tflite_model = converter.convert()
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    return len(tflite_model)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shared_weights_path(keras_path, output_dir):
+    """
+    Shared weight file for a Keras model, named after the model's content.
+
+    Returns:
+        str: ``<output_dir>/<model name>.<sha256 prefix>.tflite``
+    """
+    stem = os.path.splitext(os.path.basename(keras_path))[0]
+    return os.path.join(output_dir, f"{stem}.{_file_sha256(keras_path)[:12]}.tflite")
+
+
+def export_shared_weights(keras_path, output_dir, load_keras_model=None):
+    """
+    Export a Keras model to a shared weight file, once per model version.
+
+    Weights are kept as float32 so the builtin kernels use them in place;
+    float16 or int8 weights would be dequantized into private buffers in
+    every process. Worker processes starting together wait on a file lock
+    while the first one converts, and the file is moved into place
+    atomically, so a worker never maps a partly written model. Processes
+    that find the file already exported never import TensorFlow.
+
+    Args:
+        keras_path (str): Keras model file
+        output_dir (str): Directory shared by the workers on this host
+        load_keras_model (callable): ``load_keras_model(path)`` returning the
+            Keras model; defaults to ``tensorflow.keras.models.load_model``
+
+    Returns:
+        str: Path of the shared .tflite file
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = shared_weights_path(keras_path, output_dir)
+    if os.path.exists(output_path):
+        return output_path
+
+    with open(output_path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(output_path):
+                return output_path
+            if load_keras_model is None:
+                from tensorflow.keras.models import load_model
+
+                def load_keras_model(path):
+                    return load_model(path, compile=False)
+
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            try:
+                size = convert_to_tflite(load_keras_model(keras_path), tmp_path, quantization="none")
+                os.replace(tmp_path, output_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            print(f"Exported shared weights for {keras_path} to {output_path} ({size / 1024 / 1024:.1f} MB)")
+            return output_path
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _time_predictions(model, inputs, batch_size, repeat):
+    latencies = []
+    outputs = []
+    for start in range(0, len(inputs), batch_size):
+        batch = np.stack(inputs[start:start + batch_size])
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = model.predict_on_batch(batch)
+            timings.append(time.perf_counter() - t0)
+        latencies.append(statistics.median(timings) / len(batch))
+        outputs.append(np.asarray(result).reshape(len(batch), -1)[:, 0])
+    return np.concatenate(outputs), latencies
+
+
+def compare_backends(keras_model, tflite_model, inputs, threshold=0.5, batch_size=1, repeat=3):
+    """
+    Check that a TFLite model agrees with the Keras model and compare latency.
+
+    Args:
+        keras_model: Reference Keras model
+        tflite_model (TFLiteModel): Converted model
+        inputs (list): float32 verifier inputs
+        threshold (float): Decision threshold applied to both models' scores
+        batch_size (int): Batch size used for both models
+        repeat (int): Timed runs per batch (the median is kept)
+
+    Returns:
+        dict: Decision agreement rate, score differences and per-image latency
+    """
+    # One untimed call each so graph tracing does not count against Keras
+    keras_model.predict_on_batch(np.stack(inputs[:batch_size]))
+    tflite_model.predict_on_batch(np.stack(inputs[:batch_size]))
+
+    keras_scores, keras_latencies = _time_predictions(keras_model, inputs, batch_size, repeat)
+    tflite_scores, tflite_latencies = _time_predictions(tflite_model, inputs, batch_size, repeat)
+
+    keras_median = statistics.median(keras_latencies)
+    tflite_median = statistics.median(tflite_latencies)
+    diff = np.abs(keras_scores - tflite_scores)
+    return {
+        "samples": len(inputs),
+        "decision_agreement": float(np.mean((keras_scores >= threshold) == (tflite_scores >= threshold))),
+        "max_score_diff": float(diff.max()),
+        "mean_score_diff": float(diff.mean()),
+        "keras_ms_per_image": round(keras_median * 1000, 3),
+        "tflite_ms_per_image": round(tflite_median * 1000, 3),
+        "speedup": round(keras_median / tflite_median, 2) if tflite_median > 0 else None,
+        "tflite_model_bytes": os.path.getsize(tflite_model.path),
+    }
+
+
+def load_sample_inputs(sample_dir, limit=200):
+    """Build verifier inputs from the images in a directory."""
+    from batch_screen import find_images
+    from ingest import ingest_upload
+
+    inputs = []
+    for path in find_images(sample_dir)[:limit]:
+        with open(path, "rb") as f:
+            inputs.append(ingest_upload(f.read()).verifier_input)
+    if not inputs:
+        raise ValueError(f"No sample images found in {sample_dir}")
+    return inputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert and validate the TFLite fundus verifier.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert the Keras verifier to TFLite")
+    convert.add_argument("--keras", default=KERAS_VERIFIER_PATH, help=f"Keras model (default: {KERAS_VERIFIER_PATH})")
+    convert.add_argument("--quantization", choices=QUANTIZATION_MODES, default="float16")
+    convert.add_argument("--samples", help="Directory of fundus images for int8 calibration and the agreement check")
+    convert.add_argument("--output", help="Output .tflite path (default: fundus_verifier.<mode>.tflite)")
+
+    compare = subparsers.add_parser("compare", help="Compare a TFLite verifier against the Keras model")
+    compare.add_argument("--keras", default=KERAS_VERIFIER_PATH, help=f"Keras model (default: {KERAS_VERIFIER_PATH})")
+    compare.add_argument("--tflite", required=True, help="TFLite model to check")
+    compare.add_argument("--samples", required=True, help="Directory of fundus images")
+    compare.add_argument("--threads", type=int, help="TFLite interpreter threads")
+    compare.add_argument("--batch-size", type=int, default=1)
+
+    export = subparsers.add_parser("export-shared", help="Export a Keras model to a shared weight file")
+    export.add_argument("--keras", required=True, help="Keras model file")
+    shared_dir = os.environ.get("KHAIRE_SHARED_WEIGHTS_DIR")
+    export.add_argument("--output-dir", default=shared_dir, required=not shared_dir,
+                        help="Shared weights directory (default: KHAIRE_SHARED_WEIGHTS_DIR)")
+
+    args = parser.parse_args(argv)
+    if args.command == "export-shared":
+        print(export_shared_weights(args.keras, args.output_dir))
+        return 0
+
+    # Loaded from the file rather than the model registry, which serves a
+    # TFLite model when KHAIRE_VERIFIER_BACKEND or KHAIRE_SHARED_WEIGHTS_DIR is set
+    from tensorflow.keras.models import load_model
+
+    keras_model = load_model(args.keras, compile=False)
+    samples = load_sample_inputs(args.samples) if args.samples else None
+
+    if args.command == "convert":
+        output = args.output or f"fundus_verifier.{args.quantization}.tflite"
+        size = convert_to_tflite(keras_model, output, args.quantization, samples)
+        print(f"Wrote {output} ({size / 1024 / 1024:.1f} MB)")
+        if samples:
+            print(json.dumps(compare_backends(keras_model, TFLiteModel(output), samples), indent=2))
+    else:
+        tflite_model = TFLiteModel(args.tflite, num_threads=args.threads)
+        report = compare_backends(keras_model, tflite_model, samples, batch_size=args.batch_size)
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
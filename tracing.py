@@ -0,0 +1,128 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Where finished traces are appended, one JSON object per line
+TRACE_LOG_PATH = os.environ.get("KHAIRE_TRACE_LOG", "traces.jsonl")
+# Once the log reaches this size it is moved to <path>.1, replacing the
+# previous one, so at most twice this much disk is used
+TRACE_LOG_MAX_BYTES = int(float(os.environ.get("KHAIRE_TRACE_LOG_MAX_MB", "50")) * 1024 * 1024)
+TRACING_ENABLED = os.environ.get("KHAIRE_TRACING", "1") == "1"
+
+_active_trace = contextvars.ContextVar("active_trace", default=None)
+_active_span = contextvars.ContextVar("active_span", default=None)
+_log_lock = threading.Lock()
+
+
+class Trace:
+    """
+    Timing record for one request (an upload or an analysis).
+
+    Spans are timed sections of the request. They nest, record their
+    duration and any attributes such as image sizes, and mark errors raised
+    inside them.
+    """
+
+    def __init__(self, name, **attributes):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.spans = []
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    @contextmanager
+    def activate(self):
+        """Make this the current trace for ``span()`` calls in this thread or context."""
+        token = _active_trace.set(self)
+        try:
+            yield self
+        finally:
+            _active_trace.reset(token)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _active_span.get()
+        record = {
+            "name": name,
+            "parent": parent["name"] if parent else None,
+            "start_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "duration_ms": None,
+            "attributes": attributes,
+            "error": None,
+        }
+        self.spans.append(record)
+        token = _active_span.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            _active_span.reset(token)
+
+    def finish(self, log_path=None):
+        """Stop the clock and append the trace to the JSONL log."""
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        if TRACING_ENABLED:
+            write_trace(self, log_path or TRACE_LOG_PATH)
+        return self
+
+    def to_record(self):
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "spans": self.spans,
+        }
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a section of code within the current trace.
+
+    Does nothing beyond running the block when no trace is active, so
+    library code can be instrumented unconditionally.
+    """
+    trace = _active_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attributes) as record:
+        yield record
+
+
+def set_attributes(**attributes):
+    """Attach attributes (e.g. output sizes) to the current span."""
+    record = _active_span.get()
+    if record is not None:
+        record["attributes"].update(attributes)
+
+
+def record_error(error):
+    """Mark the current span as failed without re-raising, for handled errors."""
+    record = _active_span.get()
+    if record is not None:
+        record["error"] = f"{type(error).__name__}: {error}"
+
+
+def write_trace(trace, path, max_bytes=TRACE_LOG_MAX_BYTES):
+    line = json.dumps(trace.to_record(), default=str) + "\n"
+    try:
+        with _log_lock:
+            if max_bytes and os.path.exists(path) and os.path.getsize(path) + len(line) > max_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "a") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"Error writing trace log: {e}")
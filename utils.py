@@ -5,21 +5,34 @@ import plotly.express as px
 import plotly.graph_objects as go
 from PIL import Image, ImageEnhance, ImageFilter
 import io
+import os
+import math
+import html
 import base64
+from functools import lru_cache
+import cv2
+from image_buffer import ImageBuffer
 
 def preprocess_image(image):
     """
     Preprocess the uploaded retinal image for better analysis.
     
     Args:
-        image (PIL.Image): The uploaded retinal image
+        image: The uploaded retinal image as a PIL Image or ImageBuffer
         
     Returns:
         PIL.Image: Processed image ready for analysis
     """
     # Resize image to a standard size if needed
     target_size = (512, 512)
-    image = image.resize(target_size)
+    if isinstance(image, ImageBuffer):
+        if image.size == target_size:
+            image = image.to_pil()
+        else:
+            # Resize from the shared buffer so only the 512px result is copied into PIL
+            image = Image.fromarray(cv2.resize(image.array, target_size, interpolation=cv2.INTER_AREA))
+    elif image.size != target_size:
+        image = image.resize(target_size)
     
     # Convert to RGB if needed
     if image.mode != "RGB":
@@ -34,6 +47,96 @@ def preprocess_image(image):
     
     return sharpened_image
 
+# "plotly" for interactive gauges, "svg" for lightweight inline SVG gauges
+GAUGE_RENDERER = os.environ.get("KHAIRE_GAUGE_RENDERER", "plotly")
+
+GAUGE_HEIGHT = 250
+
+# Colored bands of each gauge type: (low threshold, high threshold, band colors)
+RISK_BANDS = (30, 70, ('lightgreen', 'lightyellow', 'lightcoral'))
+HEALTH_BANDS = (40, 70, ('lightcoral', 'lightyellow', 'lightgreen'))
+
+@lru_cache(maxsize=512)
+def _gauge_figure(score, title, thresholds, band_colors, bar_color):
+    """
+    Build a Plotly gauge figure.
+    
+    Memoized across reruns and sessions by its inputs, so unchanged scores
+    skip figure construction and validation. ``st.plotly_chart`` only takes
+    figure objects and still serializes the cached figure to JSON on every
+    call; that part is not cached. The returned figure is shared and must
+    not be modified by callers.
+    """
+    low, high = thresholds
+    ranges = [(0, low), (low, high), (high, 100)]
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = score,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': title},
+        gauge = {
+            'axis': {'range': [0, 100], 'tickwidth': 1, 'tickcolor': "darkblue"},
+            'bar': {'color': bar_color},
+            'bgcolor': "white",
+            'borderwidth': 2,
+            'bordercolor': "gray",
+            'steps': [
+                {'range': list(r), 'color': c} for r, c in zip(ranges, band_colors)
+            ],
+        }
+    ))
+    
+    fig.update_layout(height=GAUGE_HEIGHT, margin=dict(l=20, r=20, t=50, b=20))
+    return fig
+
+def _arc_point(value, cx, cy, radius):
+    # 0 maps to the left end of the half circle and 100 to the right end
+    angle = math.pi * (1 - value / 100)
+    return cx + radius * math.cos(angle), cy - radius * math.sin(angle)
+
+def _arc_path(start, end, cx, cy, radius):
+    x0, y0 = _arc_point(start, cx, cy, radius)
+    x1, y1 = _arc_point(end, cx, cy, radius)
+    return f"M {x0:.1f} {y0:.1f} A {radius} {radius} 0 0 1 {x1:.1f} {y1:.1f}"
+
+@lru_cache(maxsize=512)
+def _gauge_svg(score, title, thresholds, band_colors, bar_color):
+    """
+    Render a gauge as a small inline SVG.
+    
+    Looks like the Plotly gauge but needs no Plotly payload or JavaScript
+    in the browser.
+    """
+    cx, cy, radius = 150, 170, 110
+    low, high = thresholds
+    ranges = [(0, low), (low, high), (high, 100)]
+    
+    bands = "".join(
+        f'<path d="{_arc_path(a, b, cx, cy, radius)}" stroke="{color}" stroke-width="36" fill="none"/>'
+        for (a, b), color in zip(ranges, band_colors)
+    )
+    bar = ""
+    if score > 0:
+        bar = f'<path d="{_arc_path(0, score, cx, cy, radius)}" stroke="{bar_color}" stroke-width="14" fill="none"/>'
+    
+    return (
+        f'<svg viewBox="0 0 300 {GAUGE_HEIGHT}" width="100%" height="{GAUGE_HEIGHT}" '
+        f'xmlns="http://www.w3.org/2000/svg" role="img" aria-label="{html.escape(title)}: {score:g}">'
+        f'<text x="{cx}" y="30" text-anchor="middle" font-size="17">{html.escape(title)}</text>'
+        f'{bands}{bar}'
+        f'<text x="{cx}" y="{cy - 10}" text-anchor="middle" font-size="40">{score:g}</text>'
+        f'<text x="{cx - radius}" y="{cy + 30}" text-anchor="middle" font-size="12">0</text>'
+        f'<text x="{cx + radius}" y="{cy + 30}" text-anchor="middle" font-size="12">100</text>'
+        f'</svg>'
+    )
+
+def _show_gauge(score, title, bands, bar_color):
+    low, high, band_colors = bands
+    if GAUGE_RENDERER == "svg":
+        st.markdown(_gauge_svg(score, title, (low, high), band_colors, bar_color), unsafe_allow_html=True)
+    else:
+        st.plotly_chart(_gauge_figure(score, title, (low, high), band_colors, bar_color), use_container_width=True)
+
 def create_risk_gauge(risk_score, title):
     """
     Create a gauge chart to visualize risk scores.
@@ -43,7 +146,7 @@ def create_risk_gauge(risk_score, title):
         title (str): Title for the gauge chart
     """
     # Ensure risk_score is within bounds
-    risk_score = max(0, min(100, risk_score))
+    risk_score = max(0, min(100, float(risk_score)))
     
     # Define color based on risk level
     if risk_score < 30:
@@ -53,28 +156,7 @@ def create_risk_gauge(risk_score, title):
     else:
         color = "red"
     
-    # Create gauge chart
-    fig = go.Figure(go.Indicator(
-        mode = "gauge+number",
-        value = risk_score,
-        domain = {'x': [0, 1], 'y': [0, 1]},
-        title = {'text': title},
-        gauge = {
-            'axis': {'range': [0, 100], 'tickwidth': 1, 'tickcolor': "darkblue"},
-            'bar': {'color': color},
-            'bgcolor': "white",
-            'borderwidth': 2,
-            'bordercolor': "gray",
-            'steps': [
-                {'range': [0, 30], 'color': 'lightgreen'},
-                {'range': [30, 70], 'color': 'lightyellow'},
-                {'range': [70, 100], 'color': 'lightcoral'}
-            ],
-        }
-    ))
-    
-    fig.update_layout(height=250, margin=dict(l=20, r=20, t=50, b=20))
-    st.plotly_chart(fig, use_container_width=True)
+    _show_gauge(risk_score, title, RISK_BANDS, color)
 
 def create_health_score_chart(health_score, title):
     """
@@ -85,7 +167,7 @@ def create_health_score_chart(health_score, title):
         title (str): Title for the chart
     """
     # Ensure health_score is within bounds
-    health_score = max(0, min(100, health_score))
+    health_score = max(0, min(100, float(health_score)))
     
     # Define categories based on score
     if health_score < 40:
@@ -98,28 +180,7 @@ def create_health_score_chart(health_score, title):
         category = "Good"
         color = "green"
     
-    # Create the gauge chart
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=health_score,
-        domain={'x': [0, 1], 'y': [0, 1]},
-        title={'text': title},
-        gauge={
-            'axis': {'range': [0, 100], 'tickwidth': 1, 'tickcolor': "darkblue"},
-            'bar': {'color': color},
-            'bgcolor': "white",
-            'borderwidth': 2,
-            'bordercolor': "gray",
-            'steps': [
-                {'range': [0, 40], 'color': 'lightcoral'},
-                {'range': [40, 70], 'color': 'lightyellow'},
-                {'range': [70, 100], 'color': 'lightgreen'}
-            ],
-        }
-    ))
-    
-    fig.update_layout(height=250, margin=dict(l=20, r=20, t=50, b=20))
-    st.plotly_chart(fig, use_container_width=True)
+    _show_gauge(health_score, title, HEALTH_BANDS, color)
     st.markdown(f"**Health Category**: {category}")
 
 def display_condition_descriptions():
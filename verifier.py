@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+
+from inference import BatchScheduler
+from model_registry import registry
+from pyramid import ImagePyramid, InputSpec
+
+VERIFIER_MODEL_NAME = "fundus_verifier"
+VERIFIER_INPUT_SIZE = (224, 224)
+# Chosen on inputs resized by PIL bicubic; uploads now go through
+# ingest_upload's draft decode and area resize, see its docstring
+VERIFIER_THRESHOLD = 0.5
+VERIFIER_INPUT_SPEC = InputSpec(VERIFIER_INPUT_SIZE, np.float32, "unit")
+# Seconds to wait for the verifier; covers loading the model on first use
+VERIFIER_TIMEOUT = float(os.environ.get("KHAIRE_VERIFIER_TIMEOUT", "60"))
+
+
+def load_fundus_model(path=None):
+    """
+    Get the Keras model that decides whether an image is a fundus photo.
+
+    Args:
+        path (str): Load this file directly instead of the registry's shared,
+            warmed-up instance
+
+    Returns:
+        The verifier model
+    """
+    if path is None:
+        return registry.get(VERIFIER_MODEL_NAME)
+
+    # Deferred so importing this module (and app.py) does not load TensorFlow
+    from tensorflow.keras.models import load_model
+
+    return load_model(path)
+
+
+def prepare_verifier_input(img):
+    """
+    Convert an image into the verifier's input format.
+
+    Args:
+        img: ImagePyramid of the upload, or a PIL Image, ImageBuffer or RGB
+            array to build one from
+
+    Returns:
+        np.ndarray: Read-only float32 array of shape (224, 224, 3) scaled to [0, 1]
+    """
+    if not isinstance(img, ImagePyramid):
+        img = ImagePyramid(img)
+    return img.input_for(VERIFIER_INPUT_SPEC)
+
+
+def verification_key(content_hash, model_version=None):
+    """
+    Cache key for a verifier decision on one image.
+
+    The key includes the verifier's version, so a hot-swapped or updated
+    model file invalidates earlier decisions without clearing any cache.
+
+    Args:
+        content_hash (str): SHA-256 of the uploaded bytes
+        model_version (str): Verifier version; defaults to the registry's
+
+    Returns:
+        str: Cache key
+    """
+    return f"{content_hash}:{model_version or registry.version(VERIFIER_MODEL_NAME)}"
+
+
+def _predict_with_registry_model(batch):
+    # Resolved per batch so a hot-swapped model is used from the next batch on
+    return registry.get(VERIFIER_MODEL_NAME).predict_on_batch(batch)
+
+
+def create_verifier_scheduler(fundus_model=None, max_batch_size=8, max_wait_ms=5.0):
+    """
+    Wrap the verifier model in a BatchScheduler shared by all callers.
+
+    Args:
+        fundus_model: Model to use; defaults to the registry's verifier, which
+            follows hot swaps
+        max_batch_size (int): Largest batch sent to the model
+        max_wait_ms (float): How long to wait for a batch to fill
+
+    Returns:
+        BatchScheduler: Scheduler for verifier inputs
+    """
+    predict_fn = _predict_with_registry_model if fundus_model is None else fundus_model.predict_on_batch
+    return BatchScheduler(
+        predict_fn,
+        input_shape=VERIFIER_INPUT_SIZE + (3,),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+    )
+
+
+def verify_fundus(img, scheduler, timeout=VERIFIER_TIMEOUT):
+    """
+    Check whether an image is a retinal fundus photo.
+
+    Args:
+        img: Uploaded image as a PIL Image, ImageBuffer or ImagePyramid
+        scheduler (BatchScheduler): Scheduler wrapping the verifier model
+        timeout (float): Seconds to wait for the verifier
+
+    Returns:
+        bool: True if the verifier accepts the image
+    """
+    return verify_fundus_input(prepare_verifier_input(img), scheduler, timeout)
+
+
+def verify_fundus_input(verifier_input, scheduler, timeout=VERIFIER_TIMEOUT):
+    """
+    Check a prepared verifier tensor, e.g. ``IngestedUpload.verifier_input``.
+
+    Args:
+        verifier_input (np.ndarray): float32 array of shape (224, 224, 3)
+        scheduler (BatchScheduler): Scheduler wrapping the verifier model
+        timeout (float): Seconds to wait for the verifier
+
+    Returns:
+        bool: True if the verifier accepts the image
+
+    Raises:
+        concurrent.futures.TimeoutError: If the verifier does not answer in time
+    """
+    pred = scheduler.predict(verifier_input, timeout=timeout)[0]
+    return bool(pred >= VERIFIER_THRESHOLD)
+
+
+def score_fundus_batch(fundus_model, inputs):
+    """
+    Run the verifier directly on a batch of prepared inputs.
+
+    Args:
+        fundus_model: Loaded verifier model
+        inputs (list): Arrays returned by ``prepare_verifier_input``
+
+    Returns:
+        np.ndarray: Verifier score for each input
+    """
+    preds = fundus_model.predict_on_batch(np.stack(inputs))
+    return np.asarray(preds).reshape(len(inputs), -1)[:, 0]